@@ -3,6 +3,10 @@
 
 Оптимизация: файл читается ОДИН раз на chunk_size.
 Все алгоритмы обрабатываются за один проход по сегментам.
+
+Для размеров из DELTA_CHUNK_SIZES похожие сегменты пишутся дельтой:
+в результатах - сэкономленные байты, время дельта-кодирования при записи
+и время восстановления файла (с проверкой хэша).
 """
 
 import os
@@ -12,6 +16,7 @@ import csv
 from app.config import get_postgres_config, CHUNK_SIZES, HASH_ALGORITHMS, FILE_READ_SIZE
 from app.db_manager import DBManager
 from app.storage_manager import StorageManager
+from app.delta import DeltaStore, SegmentResolver
 
 ORIGIN_DIR = "./origin_data"
 RESULTS_FILE = "analytics/benchmark_results.csv"
@@ -25,8 +30,29 @@ def get_full_file_hash(filepath: str) -> str:
     return hasher.hexdigest()
 
 
+def measure_restore(file_id: int, chunk_size: int, algo: str, file_hash: str,
+                    db: DBManager, storage: StorageManager) -> dict:
+    """Восстановление файла в память: время, раскрытые дельты, проверка хэша"""
+    resolver = SegmentResolver(db, storage)
+    start = time.time()
+    recipe = db.get_file_recipe(file_id, chunk_size, algo)
+    hasher = hashlib.sha256()
+    batch = max(1, FILE_READ_SIZE // chunk_size)
+    for i in range(0, len(recipe), batch):
+        spans = [(offset, size) for _, offset, size in recipe[i:i + batch]]
+        for data in resolver.read(chunk_size, spans):
+            hasher.update(data)
+    return {
+        "time_restore": round(time.time() - start, 4),
+        "time_restore_delta": round(resolver.time_decode, 4),
+        "restore_deltas": resolver.decoded,
+        "restore_ok": hasher.hexdigest() == file_hash,
+    }
+
+
 def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
-                           db: DBManager, storage: StorageManager) -> list[dict]:
+                           db: DBManager, storage: StorageManager,
+                           deltas: DeltaStore) -> list[dict]:
     """
     Один проход по файлу — все алгоритмы сразу.
 
@@ -47,6 +73,9 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
         return []
 
     file_id = db.register_file(file_name, file_hash, file_size)
+    for algo in algos_todo:
+        db.remove_file_recipe(file_id, chunk_size, algo)
+        db.prepare_recipe_partition(chunk_size, algo, file_id, -(-file_size // chunk_size))
 
     # Метрики для каждого алгоритма
     metrics = {}
@@ -58,6 +87,9 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
         }
 
     storage_writes = 0
+    delta_segments = deltas.delta_segments
+    delta_saved = deltas.bytes_saved
+    delta_time = deltas.time_delta
     start_total = time.time()
 
     with open(filepath, "rb") as f:
@@ -75,8 +107,8 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
             if stored is not None:
                 offset, seg_size = stored
             else:
-                offset = storage.write_segment(chunk_size, data)
-                db.save_storage_index(chunk_size, content_hash, offset, len(data))
+                offset, seg_size = deltas.write(chunk_size, data), len(data)
+                db.save_storage_index(chunk_size, content_hash, offset, seg_size)
                 storage_writes += 1
 
             # 3. Для каждого алгоритма — хэш + таблицы
@@ -90,7 +122,7 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
 
                 existing = db.get_segment_offset(chunk_size, algo, algo_hash)
                 if existing is None:
-                    db.save_segment(chunk_size, algo, algo_hash, offset, len(data))
+                    db.save_segment(chunk_size, algo, algo_hash, offset, seg_size)
                     metrics[algo]["unique"] += 1
                 else:
                     db.increment_ref_count(chunk_size, algo, algo_hash)
@@ -108,6 +140,9 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
     for algo in algos_todo:
         db.mark_processing_done(file_hash, chunk_size, algo)
 
+    # Восстановление - один раз на chunk_size, записи хранилища общие для алгоритмов
+    restore = measure_restore(file_id, chunk_size, algos_todo[0], file_hash, db, storage)
+
     # Формируем результаты
     results = []
     for algo in algos_todo:
@@ -123,6 +158,10 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
             "time_hashing": round(metrics[algo]["time_hashing"], 6),
             "time_total": round(elapsed_total, 4),
             "storage_size": storage.storage_size(chunk_size),
+            "delta_segments": deltas.delta_segments - delta_segments,
+            "delta_bytes_saved": deltas.bytes_saved - delta_saved,
+            "time_delta": round(deltas.time_delta - delta_time, 4),
+            **restore,
         })
 
     return results
@@ -131,6 +170,7 @@ def process_file_all_algos(filepath: str, chunk_size: int, algos: list[str],
 def run_benchmark():
     db = DBManager(get_postgres_config())
     storage = StorageManager()
+    deltas = DeltaStore(db, storage)
 
     if not os.path.exists(ORIGIN_DIR):
         os.makedirs(ORIGIN_DIR)
@@ -157,7 +197,7 @@ def run_benchmark():
         for chunk_size in CHUNK_SIZES:
             print(f"  {fname} | {chunk_size} | все алгоритмы ... ", end="", flush=True)
 
-            results = process_file_all_algos(filepath, chunk_size, HASH_ALGORITHMS, db, storage)
+            results = process_file_all_algos(filepath, chunk_size, HASH_ALGORITHMS, db, storage, deltas)
 
             if not results:
                 print("пропуск")
@@ -167,6 +207,12 @@ def run_benchmark():
             r = results[0]
             print(f"{r['time_total']}с, сегментов: {r['total_segments']}, "
                   f"записей в storage: {r['storage_writes']}")
+            if r["delta_segments"]:
+                print(f"      дельты: {r['delta_segments']}, сэкономлено {r['delta_bytes_saved']:,} байт, "
+                      f"кодирование={r['time_delta']}с")
+            print(f"      восстановление: {r['time_restore']}с "
+                  f"(дельт раскрыто: {r['restore_deltas']}, декодирование={r['time_restore_delta']}с), "
+                  f"хэш {'совпал' if r['restore_ok'] else 'НЕ СОВПАЛ'}")
 
             for r in results:
                 print(f"      {r['algo']}: уник={r['unique_segments']}, "
@@ -0,0 +1,251 @@
+"""
+Оценка дедупликации без полной загрузки: один проход по файлам, без БД и хранилища.
+
+Для каждого chunk_size число уникальных сегментов оценивается скетчем
+HyperLogLog (фиксированная память: 2^p байт на размер сегмента).
+Файл читается ОДИН раз блоками FILE_READ_SIZE, все размеры сегментов
+обрабатываются за этот проход.
+
+С --sample-rate q файлы тоже читаются целиком, но считаются только сегменты
+с хэшем меньше q * 2^64 - точно, множеством вместо скетча (см. ChunkStats).
+Все копии сегмента попадают в выборку вместе, поэтому оценка несмещённая
+при любом расположении дублей; память - около q от числа уникальных сегментов.
+
+Запуск:
+    python -m analytics.estimate [каталоги...] [--precision 14] [--sample-rate 0.01]
+"""
+
+import os
+import math
+import time
+import csv
+import hashlib
+import argparse
+from app.config import CHUNK_SIZES, HASH_ALGORITHMS, FILE_READ_SIZE
+
+ORIGIN_DIR = "./origin_data"
+RESULTS_FILE = "analytics/estimate_results.csv"
+
+# z для двустороннего 95% доверительного интервала
+Z_95 = 1.96
+
+# Длина hex-хэша в таблицах unique_segments / file_chunks
+HASH_HEX_LEN = {algo: hashlib.new(algo).digest_size * 2 for algo in HASH_ALGORITHMS}
+
+
+class HyperLogLog:
+    """Скетч HyperLogLog: оценка числа различных 64-битных значений."""
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision должна быть в диапазоне 4..18")
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._rest_bits = 64 - precision
+        self._rest_mask = (1 << self._rest_bits) - 1
+
+    def add(self, value: int):
+        """Добавить 64-битное значение хэша"""
+        idx = value >> self._rest_bits
+        rest = value & self._rest_mask
+        rank = self._rest_bits - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def _alpha(self) -> float:
+        if self.m == 16:
+            return 0.673
+        if self.m == 32:
+            return 0.697
+        if self.m == 64:
+            return 0.709
+        return 0.7213 / (1 + 1.079 / self.m)
+
+    def count(self) -> float:
+        """Оценка кардинальности (с поправкой linear counting для малых значений)"""
+        m = self.m
+        total = math.fsum(2.0 ** -r for r in self.registers)
+        estimate = self._alpha() * m * m / total
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                return m * math.log(m / zeros)
+        return estimate
+
+    def relative_error(self) -> float:
+        """Стандартная относительная ошибка оценки"""
+        return 1.04 / math.sqrt(self.m)
+
+
+class ChunkStats:
+    """
+    Счётчики одного chunk_size.
+    sample_rate = 1: все сегменты - в скетч HyperLogLog.
+    sample_rate = q < 1: сегменты с хэшем меньше q * 2^64 - в множество (точный подсчёт).
+    Попадание зависит только от содержимого сегмента, поэтому каждый уникальный
+    сегмент попадает в выборку с вероятностью q независимо от числа и места копий.
+    """
+
+    def __init__(self, chunk_size: int, precision: int, sample_rate: float = 1.0, seed: int = 0):
+        self.chunk_size = chunk_size
+        self.sample_rate = min(sample_rate, 1.0)
+        self.key = seed.to_bytes(8, "big")
+        self.total_bytes = 0
+        self.total_segments = 0
+        if self.sample_rate < 1:
+            self.sketch = None
+            self.sampled = set()
+            self.threshold = int(self.sample_rate * 2 ** 64)
+        else:
+            self.sketch = HyperLogLog(precision)
+
+    def feed(self, block: bytes):
+        """
+        Нарезать блок на сегменты так же, как process_file: блоки выровнены
+        по FILE_READ_SIZE, поэтому границы сегментов совпадают с границами от начала файла.
+        """
+        chunk_size = self.chunk_size
+        key = self.key
+        blake = hashlib.blake2b
+        if self.sketch is not None:
+            add = self.sketch.add
+            for pos in range(0, len(block), chunk_size):
+                add(int.from_bytes(blake(block[pos:pos + chunk_size], digest_size=8, key=key).digest(), "big"))
+        else:
+            add = self.sampled.add
+            threshold = self.threshold
+            for pos in range(0, len(block), chunk_size):
+                value = int.from_bytes(blake(block[pos:pos + chunk_size], digest_size=8, key=key).digest(), "big")
+                if value < threshold:
+                    add(value)
+        self.total_bytes += len(block)
+        self.total_segments += -(-len(block) // chunk_size)
+
+    def summary(self) -> dict:
+        """
+        Оценки и 95% доверительные границы.
+        Выборка: k различных сегментов в выборке ~ Binomial(D, q),
+        оценка D = k / q, стандартная ошибка sqrt(k * (1 - q)) / q.
+        """
+        total = self.total_segments
+        q = self.sample_rate
+        if self.sketch is not None:
+            unique = min(self.sketch.count(), total)
+            delta = Z_95 * self.sketch.relative_error() * unique
+            unique_low = max(0.0, unique - delta)
+            unique_high = min(float(total), unique + delta)
+        else:
+            k = len(self.sampled)
+            unique = min(k / q, float(total))
+            # при k = 0 граница по max(k, 1), чтобы интервал не схлопывался в точку
+            delta = Z_95 * math.sqrt(max(k, 1) * (1 - q)) / q
+            unique_low = max(float(k), unique - delta)
+            unique_high = min(float(total), unique + delta)
+        avg_segment = self.total_bytes / total if total else 0.0
+
+        def rate(u):
+            return (1 - u / total) * 100 if total else 0.0
+
+        row = {
+            "chunk_size": self.chunk_size,
+            "total_bytes": self.total_bytes,
+            "total_segments": total,
+            "sample_rate": q,
+            "unique_segments": round(unique),
+            "unique_low": round(unique_low),
+            "unique_high": round(unique_high),
+            "dedup_rate": round(rate(unique), 2),
+            "dedup_rate_low": round(rate(unique_high), 2),
+            "dedup_rate_high": round(rate(unique_low), 2),
+            # storage_{chunk_size}.bin общий для всех алгоритмов
+            "storage_size": round(unique * avg_segment),
+            "storage_size_low": round(unique_low * avg_segment),
+            "storage_size_high": round(unique_high * avg_segment),
+            # строки: storage_index_{size} и unique_segments_{size}_{algo} ~ уникальные,
+            # file_chunks_{size}_{algo} - по строке на каждый сегмент
+            "storage_index_rows": round(unique),
+            "unique_segments_rows": round(unique),
+            "file_chunks_rows": total,
+        }
+        # Объём хэшей в метаданных для каждого алгоритма
+        for algo, hex_len in HASH_HEX_LEN.items():
+            row[f"hash_bytes_{algo}"] = round((unique + total) * hex_len)
+        return row
+
+
+def list_files(directories: list[str]) -> list[str]:
+    """Все файлы каталогов (рекурсивно), кроме скрытых"""
+    files = []
+    for directory in directories:
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(names):
+                if not name.startswith("."):
+                    files.append(os.path.join(root, name))
+    return files
+
+
+def estimate(files: list[str], chunk_sizes: list[int], precision: int = 14,
+             sample_rate: float = 1.0, seed: int = 0) -> list[dict]:
+    """
+    Один проход по каждому файлу для всех chunk_size.
+    sample_rate - доля сегментов (по значению хэша), которые считаются точно.
+    """
+    stats = [ChunkStats(size, precision, sample_rate, seed) for size in chunk_sizes]
+    for filepath in files:
+        with open(filepath, "rb") as f:
+            while block := f.read(FILE_READ_SIZE):
+                for s in stats:
+                    s.feed(block)
+    return [s.summary() for s in stats]
+
+
+def run_estimate():
+    parser = argparse.ArgumentParser(description="Оценка дедупликации без записи в БД и хранилище")
+    parser.add_argument("directories", nargs="*", default=[ORIGIN_DIR])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=CHUNK_SIZES)
+    parser.add_argument("--precision", type=int, default=14,
+                        help="точность HyperLogLog: 2^p регистров (по умолчанию 14, ошибка ~0.8%%)")
+    parser.add_argument("--sample-rate", type=float, default=1.0,
+                        help="доля сегментов по хэшу для точного подсчёта вместо HyperLogLog "
+                             "(по умолчанию 1.0 - все в скетч)")
+    parser.add_argument("--seed", type=int, default=0, help="ключ хэша: другая выборка сегментов")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    files = list_files(args.directories)
+    if not files:
+        print(f"Нет файлов в: {', '.join(args.directories)}")
+        return
+
+    print(f"Файлов: {len(files)}")
+    if args.sample_rate < 1:
+        print(f"Размеров: {len(args.chunk_sizes)}, выборка сегментов по хэшу: {args.sample_rate}")
+    else:
+        print(f"Размеров: {len(args.chunk_sizes)}, HyperLogLog p={args.precision}")
+    print("=" * 60)
+
+    start = time.time()
+    results = estimate(files, args.chunk_sizes, args.precision, args.sample_rate, args.seed)
+    elapsed = time.time() - start
+
+    for r in results:
+        print(f"  {r['chunk_size']} байт: сегментов={r['total_segments']:,}, "
+              f"уник~{r['unique_segments']:,} [{r['unique_low']:,}; {r['unique_high']:,}], "
+              f"dedup~{r['dedup_rate']}% [{r['dedup_rate_low']}; {r['dedup_rate_high']}]")
+        print(f"      storage_{r['chunk_size']}.bin ~{r['storage_size']:,} байт "
+              f"[{r['storage_size_low']:,}; {r['storage_size_high']:,}], "
+              f"строк file_chunks: {r['file_chunks_rows']:,}")
+
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"\nВремя: {elapsed:.2f} сек.")
+    print(f"CSV: {args.output}")
+
+
+if __name__ == "__main__":
+    run_estimate()
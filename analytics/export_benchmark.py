@@ -0,0 +1,109 @@
+"""
+Бенчмарк выгрузки: restore_file по одному файлу против app.bulk_export
+(в каталог и в tar) для всех файлов, обработанных парой chunk_size - algo.
+
+Запуск:
+    python -m analytics.export_benchmark --chunk-size 1024 --algo sha256
+"""
+
+import io
+import csv
+import time
+import hashlib
+import argparse
+import contextlib
+from app.config import get_postgres_config, CHUNK_SIZES, HASH_ALGORITHMS, FILE_READ_SIZE
+from app.db_manager import DBManager
+from app.storage_manager import StorageManager
+from app.main import restore_file
+from app.bulk_export import BulkExporter
+
+RESULTS_FILE = "analytics/export_benchmark_results.csv"
+BULK_DIR = "restored_data/bulk_export"
+BULK_TAR = "restored_data/bulk_export.tar"
+
+
+def file_hash(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(FILE_READ_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def run_export_benchmark():
+    parser = argparse.ArgumentParser(description="Пакетная выгрузка против restore_file")
+    parser.add_argument("--chunk-size", type=int, required=True, choices=CHUNK_SIZES)
+    parser.add_argument("--algo", required=True, choices=HASH_ALGORITHMS)
+    args = parser.parse_args()
+
+    db = DBManager(get_postgres_config())
+    storage = StorageManager()
+    files = db.list_processed_files(args.chunk_size, args.algo)
+    if not files:
+        print(f"Нет файлов, обработанных парой {args.chunk_size}_{args.algo}")
+        db.close()
+        return
+    total_bytes = sum(size for _, _, size in files)
+    print(f"Файлов: {len(files)}, {total_bytes:,} байт")
+    print("=" * 60)
+
+    results = []
+
+    # 1. По одному файлу
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for file_id, file_name, _ in files:
+            restore_file(file_id, file_name, args.chunk_size, args.algo, db, storage)
+    results.append(("restore_file", time.time() - start))
+
+    # 2. Пакетно в каталог
+    exporter = BulkExporter(db, storage, args.chunk_size, args.algo)
+    start = time.time()
+    paths = exporter.export_to_dir(files, BULK_DIR)
+    results.append(("bulk_dir", time.time() - start))
+
+    # 3. Пакетно в tar
+    exporter = BulkExporter(db, storage, args.chunk_size, args.algo)
+    start = time.time()
+    with open(BULK_TAR, "wb") as f:
+        exporter.export_to_tar(files, f)
+    results.append(("bulk_tar", time.time() - start))
+
+    # Проверка: пакетная выгрузка совпадает с restore_file
+    mismatched = [
+        path for path, (_, file_name, _) in zip(paths, files)
+        if file_hash(path) != file_hash(f"restored_data/RESTORED_{file_name}")
+    ]
+
+    rows = []
+    baseline = results[0][1]
+    for mode, elapsed in results:
+        rows.append({
+            "mode": mode,
+            "chunk_size": args.chunk_size,
+            "algo": args.algo,
+            "files": len(files),
+            "total_bytes": total_bytes,
+            "time": round(elapsed, 4),
+            "mb_per_sec": round(total_bytes / elapsed / 1048576, 2) if elapsed else 0,
+            "speedup": round(baseline / elapsed, 2) if elapsed else 0,
+        })
+        print(f"  {mode:<13} {elapsed:8.2f} сек.  {rows[-1]['mb_per_sec']:8.2f} МБ/с  x{rows[-1]['speedup']}")
+
+    # restore_file пишет по имени - одноимённые файлы перезаписывают друг друга
+    if mismatched:
+        print(f"\nНе совпали с restore_file ({len(mismatched)}): {', '.join(mismatched[:5])}")
+    else:
+        print("\nПакетная выгрузка совпадает с restore_file")
+
+    with open(RESULTS_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"CSV: {RESULTS_FILE}")
+    db.close()
+
+
+if __name__ == "__main__":
+    run_export_benchmark()
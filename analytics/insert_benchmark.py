@@ -0,0 +1,154 @@
+"""
+Бенчмарк скорости вставки метаданных по мере роста таблиц.
+
+Синтетические рецепты (file_chunks + unique_segments) пишутся раундами
+построчно (как process_file) и пакетно (bulk_load_file_chunks) в обычные
+и секционированные таблицы. Для каждого раунда - размер таблицы до вставки
+и строк/сек. В конце - время удаления рецепта одного файла. В секционированной
+схеме рецепт от --file-partition-min-rows строк получает свою секцию
+(пакетно - загрузка в таблицу без индексов и ATTACH), удаление - DROP.
+
+Таблицы создаются в отдельной схеме PostgreSQL и удаляются после прогона.
+
+Запуск:
+    python -m analytics.insert_benchmark --rounds 20 --rows 50000
+"""
+
+import csv
+import time
+import random
+import hashlib
+import argparse
+from psycopg2 import sql
+from app.config import get_postgres_config, METADATA_PARTITIONS, FILE_PARTITION_MIN_ROWS
+from app.db_manager import DBManager
+from app.init_db import create_schema
+
+RESULTS_FILE = "analytics/insert_benchmark_results.csv"
+BENCH_SCHEMA = "insert_bench"
+CHUNK_SIZE = 1024
+ALGO = "sha256"
+
+
+def make_recipe(rows: int, dup_rate: float, seen: list[str], counter: list[int]) -> list[str]:
+    """Хэши сегментов рецепта: dup_rate - доля повторов уже встречавшихся сегментов"""
+    recipe = []
+    for _ in range(rows):
+        if seen and random.random() < dup_rate:
+            recipe.append(random.choice(seen))
+        else:
+            counter[0] += 1
+            seg_hash = hashlib.sha256(counter[0].to_bytes(8, "big")).hexdigest()
+            recipe.append(seg_hash)
+            if len(seen) < 100000:
+                seen.append(seg_hash)
+            else:
+                seen[random.randrange(len(seen))] = seg_hash
+    return recipe
+
+
+def insert_rows(db: DBManager, file_id: int, recipe: list[str], min_rows: int):
+    """Построчно, как process_file"""
+    db.prepare_recipe_partition(CHUNK_SIZE, ALGO, file_id, len(recipe), min_rows=min_rows)
+    for idx, seg_hash in enumerate(recipe):
+        if db.get_segment_offset(CHUNK_SIZE, ALGO, seg_hash) is None:
+            db.save_segment(CHUNK_SIZE, ALGO, seg_hash, idx * CHUNK_SIZE, CHUNK_SIZE)
+        else:
+            db.increment_ref_count(CHUNK_SIZE, ALGO, seg_hash)
+        db.save_file_structure(CHUNK_SIZE, ALGO, file_id, idx, seg_hash)
+
+
+def insert_bulk(db: DBManager, file_id: int, recipe: list[str], min_rows: int):
+    """Пакетно, как process_file_bulk"""
+    own_partition = db.prepare_recipe_partition(CHUNK_SIZE, ALGO, file_id, len(recipe),
+                                                detached=True, min_rows=min_rows)
+    segments = {}
+    for idx, seg_hash in enumerate(recipe):
+        segment = segments.get(seg_hash)
+        if segment is None:
+            segments[seg_hash] = [CHUNK_SIZE, idx * CHUNK_SIZE, 1]
+        else:
+            segment[2] += 1
+    db.bulk_load_file_chunks(CHUNK_SIZE, ALGO, file_id, list(enumerate(recipe)), segments, own_partition)
+    if own_partition:
+        db.attach_recipe_partition(CHUNK_SIZE, ALGO, file_id)
+
+
+def reset_schema(db: DBManager, partitioned: bool, partitions: int):
+    with db.conn.cursor() as cur:
+        cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {s} CASCADE").format(s=sql.Identifier(BENCH_SCHEMA)))
+        cur.execute(sql.SQL("CREATE SCHEMA {s}").format(s=sql.Identifier(BENCH_SCHEMA)))
+        cur.execute(sql.SQL("SET search_path TO {s}").format(s=sql.Identifier(BENCH_SCHEMA)))
+    create_schema(db.conn, partitioned, partitions)
+
+
+def run_case(db: DBManager, mode: str, partitioned: bool, args) -> list[dict]:
+    reset_schema(db, partitioned, args.partitions)
+    insert = insert_bulk if mode == "bulk" else insert_rows
+    layout = f"partitioned_{args.partitions}" if partitioned else "plain"
+    random.seed(args.seed)
+    seen, counter = [], [0]
+    table_rows = 0
+    results = []
+    file_id = None
+
+    for r in range(args.rounds):
+        recipe = make_recipe(args.rows, args.dup_rate, seen, counter)
+        file_id = db.register_file(f"bench_{r}", f"bench_{mode}_{layout}_{r}", args.rows * CHUNK_SIZE)
+        start = time.time()
+        insert(db, file_id, recipe, args.file_partition_min_rows)
+        elapsed = time.time() - start
+        results.append({
+            "mode": mode,
+            "layout": layout,
+            "round": r,
+            "table_rows": table_rows,
+            "rows": args.rows,
+            "seconds": round(elapsed, 4),
+            "rows_per_sec": round(args.rows / elapsed, 1) if elapsed else 0,
+            "remove_seconds": "",
+        })
+        table_rows += args.rows
+        print(f"  {mode:<4} {layout:<15} раунд {r:>3}: таблица {table_rows - args.rows:>12,} строк, "
+              f"{results[-1]['rows_per_sec']:>10,.0f} строк/с")
+
+    # Удаление рецепта одного файла
+    start = time.time()
+    db.remove_file_recipe(file_id, CHUNK_SIZE, ALGO)
+    results[-1]["remove_seconds"] = round(time.time() - start, 4)
+    print(f"  удаление рецепта ({args.rows:,} строк): {results[-1]['remove_seconds']} сек.")
+    return results
+
+
+def run_insert_benchmark():
+    parser = argparse.ArgumentParser(description="Скорость вставки метаданных по мере роста таблиц")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50000, help="строк рецепта за раунд")
+    parser.add_argument("--dup-rate", type=float, default=0.3)
+    parser.add_argument("--partitions", type=int, default=METADATA_PARTITIONS)
+    parser.add_argument("--file-partition-min-rows", type=int, default=FILE_PARTITION_MIN_ROWS,
+                        help="рецепт от стольких строк - в своей секции")
+    parser.add_argument("--modes", nargs="+", default=["row", "bulk"], choices=["row", "bulk"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    db = DBManager(get_postgres_config())
+    all_results = []
+    try:
+        for mode in args.modes:
+            for partitioned in (False, True):
+                all_results.extend(run_case(db, mode, partitioned, args))
+    finally:
+        with db.conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {s} CASCADE").format(s=sql.Identifier(BENCH_SCHEMA)))
+        db.close()
+
+    with open(RESULTS_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=all_results[0].keys())
+        writer.writeheader()
+        writer.writerows(all_results)
+    print(f"\nCSV: {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    run_insert_benchmark()
@@ -0,0 +1,144 @@
+"""
+Нагрузочный тест сервера восстановления (app.restore_server).
+
+N параллельных клиентов, у каждого своё keep-alive соединение, по M запросов.
+Измеряется задержка до первого байта и до последнего байта, пропускная способность.
+
+Запуск:
+    python -m app.restore_server &
+    python -m analytics.load_test 1 --chunk-size 1024 --algo sha256 --clients 32 --requests 50
+    python -m analytics.load_test 1 --range-size 65536    # случайные Range-запросы
+"""
+
+import asyncio
+import argparse
+import json
+import random
+import time
+from urllib.parse import quote
+
+
+async def read_response(reader: asyncio.StreamReader, keep_body: bool = False) -> tuple[int, dict, bytes, int, float]:
+    """Статус, заголовки, тело (если keep_body, иначе отбрасывается), длина тела, время первого байта"""
+    status_line = await reader.readline()
+    first_byte = time.perf_counter()
+    if not status_line:
+        raise ConnectionError("Сервер закрыл соединение")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    left = int(headers.get("content-length", 0))
+    received = 0
+    body = []
+    while left:
+        data = await reader.read(min(left, 1 << 20))
+        if not data:
+            raise ConnectionError("Обрыв тела ответа")
+        left -= len(data)
+        received += len(data)
+        if keep_body:
+            body.append(data)
+    return status, headers, b"".join(body), received, first_byte
+
+
+async def fetch(host: str, port: int, path: str):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status, headers, body, _, _ = await read_response(reader, keep_body=True)
+    writer.close()
+    return status, headers, body
+
+
+async def client(host: str, port: int, path: str, requests: int, file_size: int,
+                 range_size: int | None, latencies: list, ttfb: list, counters: dict):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            head = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+            if range_size:
+                start = random.randrange(0, max(1, file_size - range_size + 1))
+                head += f"Range: bytes={start}-{start + range_size - 1}\r\n"
+            t0 = time.perf_counter()
+            writer.write((head + "\r\n").encode())
+            await writer.drain()
+            status, _, _, received, first_byte = await read_response(reader)
+            t1 = time.perf_counter()
+            if status not in (200, 206):
+                counters["errors"] += 1
+                continue
+            latencies.append(t1 - t0)
+            ttfb.append(first_byte - t0)
+            counters["bytes"] += received
+    finally:
+        writer.close()
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(args):
+    path = f"/files/{quote(args.file, safe='')}"
+    if args.chunk_size and args.algo:
+        path += f"?chunk_size={args.chunk_size}&algo={args.algo}"
+
+    # Размер файла для выбора случайных диапазонов
+    status, headers, body = await fetch(args.host, args.port, "/files")
+    if status != 200:
+        print(f"Ошибка /files: {status} {body.decode(errors='replace')}")
+        return
+    files = json.loads(body)
+    match = [f for f in files if str(f["file_id"]) == args.file or f["file_name"] == args.file]
+    if not match:
+        print(f"Файл '{args.file}' не найден на сервере")
+        return
+    file_size = match[0]["file_size"]
+
+    latencies, ttfb = [], []
+    counters = {"bytes": 0, "errors": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(args.host, args.port, path, args.requests, file_size,
+               args.range_size, latencies, ttfb, counters)
+        for _ in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    done = len(latencies)
+    print(f"Клиентов: {args.clients}, запросов: {done} (ошибок: {counters['errors']}), "
+          f"время: {elapsed:.2f} сек.")
+    print(f"Запросов/сек: {done / elapsed:.1f}")
+    print(f"Пропускная способность: {counters['bytes'] / elapsed / 1048576:.2f} МБ/с")
+    print("Задержка (мс):    p50     p95     p99     max")
+    for name, values in (("  до 1-го байта", ttfb), ("  полный ответ", latencies)):
+        print(f"{name}: " + " ".join(f"{percentile(values, p) * 1000:7.2f}" for p in (50, 95, 99, 100)))
+
+    status, _, body = await fetch(args.host, args.port, "/stats")
+    if status == 200:
+        print(f"Кэши сервера: {body.decode()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервера восстановления")
+    parser.add_argument("file", help="file_id или имя файла")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--algo")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="запросов на клиента")
+    parser.add_argument("--range-size", type=int, help="размер случайного Range-диапазона, байт")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
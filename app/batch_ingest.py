@@ -0,0 +1,280 @@
+"""
+Пакетная загрузка каталогов без интерактивного меню.
+
+Рекурсивно обходит каталоги, фильтрует файлы по шаблонам include/exclude
+и обрабатывает каждый файл всеми выбранными парами chunk_size - algo.
+
+Локальный манифест (SQLite) хранит (path, size, mtime, inode) -> file_hash
+и выполненные комбинации: если stat файла не изменился и все комбинации
+уже выполнены, файл пропускается без чтения и без запросов к PostgreSQL.
+
+Результат по каждому файлу - строка JSON в stdout, итог - в stderr.
+
+Запуск:
+    python -m app.batch_ingest origin_data --chunk-size 128 1024 --algo sha256 \
+        --include "*.log" "*.csv" --exclude "tmp/*"
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import psycopg2
+from fnmatch import fnmatch
+from app.db_manager import DBManager
+from app.storage_manager import StorageManager
+from app.delta import DeltaStore
+from app.main import get_full_file_hash, process_file, process_file_bulk
+from app.config import CHUNK_SIZES, HASH_ALGORITHMS, INGEST_MANIFEST, get_postgres_config
+
+# Как часто фиксировать изменения манифеста
+MANIFEST_COMMIT_EVERY = 1000
+
+# Сколько строк результата буферизовать перед выводом
+OUTPUT_BATCH = 1000
+
+
+class Manifest:
+    """Манифест пакетной загрузки в локальном SQLite"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                path            TEXT    PRIMARY KEY,
+                size            INTEGER NOT NULL,
+                mtime_ns        INTEGER NOT NULL,
+                inode           INTEGER NOT NULL,
+                file_hash       TEXT    NOT NULL,
+                processing_done TEXT    NOT NULL DEFAULT ''
+            )
+        """)
+        self.pending = 0
+
+    def load(self) -> dict:
+        """Весь манифест в память: path -> (size, mtime_ns, inode, file_hash, set(processing_done))"""
+        rows = self.conn.execute(
+            "SELECT path, size, mtime_ns, inode, file_hash, processing_done FROM manifest"
+        )
+        # У большинства файлов одинаковый набор комбинаций - разбираем строку один раз
+        parsed = {}
+        known = {}
+        for path, size, mtime_ns, inode, file_hash, done in rows:
+            combos = parsed.get(done)
+            if combos is None:
+                combos = parsed[done] = frozenset(done.split(",")) if done else frozenset()
+            known[path] = (size, mtime_ns, inode, file_hash, combos)
+        return known
+
+    def save(self, path: str, size: int, mtime_ns: int, inode: int, file_hash: str, done: set):
+        self.conn.execute(
+            """
+            INSERT INTO manifest (path, size, mtime_ns, inode, file_hash, processing_done)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size, mtime_ns = excluded.mtime_ns, inode = excluded.inode,
+                file_hash = excluded.file_hash, processing_done = excluded.processing_done
+            """,
+            (path, size, mtime_ns, inode, file_hash, ",".join(sorted(done))),
+        )
+        self.pending += 1
+        if self.pending >= MANIFEST_COMMIT_EVERY:
+            self.commit()
+
+    def forget(self, file_hash: str, key: str):
+        """Убрать комбинацию key у всех путей с этим хэшем (рецепт удалён из БД)"""
+        rows = self.conn.execute(
+            "SELECT path, processing_done FROM manifest WHERE file_hash = ?", (file_hash,)
+        ).fetchall()
+        for path, done in rows:
+            combos = set(done.split(",")) if done else set()
+            if key in combos:
+                combos.discard(key)
+                self.conn.execute(
+                    "UPDATE manifest SET processing_done = ? WHERE path = ?", (",".join(sorted(combos)), path)
+                )
+        self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def matches(rel_path: str, patterns: list[str]) -> bool:
+    """Совпадение относительного пути или имени файла с одним из шаблонов"""
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
+
+
+def walk_files(root: str, include: list[str], exclude: list[str]):
+    """
+    Обход каталога через os.scandir (без лишних stat на Linux).
+    Возвращает (path, os.stat_result) для файлов, прошедших фильтры;
+    если stat файла или чтение каталога не удались - (path, OSError).
+    """
+    root = os.path.abspath(root)
+    if os.path.isfile(root):
+        try:
+            yield root, os.stat(root)
+        except OSError as e:
+            yield root, e
+        return
+    stack = [(root, "")]
+    while stack:
+        directory, rel_dir = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError as e:
+            yield directory, e
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if exclude and matches(rel_path, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, rel_path))
+            elif entry.is_file(follow_symlinks=False):
+                if include and not matches(rel_path, include):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    st = e
+                yield entry.path, st
+        stack.extend(reversed(subdirs))
+
+
+class BatchIngest:
+    """Пакетная загрузка: манифест + ленивое подключение к БД"""
+
+    def __init__(self, combos: list[tuple[int, str]], manifest: Manifest, bulk: bool = False):
+        self.combos = combos
+        self.process = process_file_bulk if bulk else process_file
+        self.keys = {f"{size}_{algo}" for size, algo in combos}
+        self.manifest = manifest
+        self.known = manifest.load()
+        self._db = None
+        self._storage = None
+        self._deltas = None
+        self.totals = {"skipped": 0, "unchanged": 0, "processed": 0, "error": 0}
+
+    @property
+    def db(self) -> DBManager:
+        # Подключаемся к PostgreSQL только если есть что обрабатывать
+        if self._db is None:
+            self._db = DBManager(get_postgres_config())
+            self._storage = StorageManager()
+            # Общий кэш баз дельт на весь прогон
+            self._deltas = DeltaStore(self._db, self._storage)
+        return self._db
+
+    def ingest(self, path: str, st: os.stat_result) -> dict:
+        """Обработать один файл; path - абсолютный путь"""
+        result = {"path": path, "size": st.st_size}
+        known = self.known.get(path)
+
+        # 1. stat не изменился и все комбинации выполнены - файл не читаем
+        if known is not None:
+            size, mtime_ns, inode, file_hash, done = known
+            if (size, mtime_ns, inode) == (st.st_size, st.st_mtime_ns, st.st_ino) and self.keys <= done:
+                result.update(status="skipped", file_hash=file_hash)
+                return result
+
+        # 2. Хэш всего файла считаем один раз на все комбинации
+        start = time.time()
+        file_hash = get_full_file_hash(path)
+        done = set(known[4]) if known is not None and known[3] == file_hash else set()
+
+        segments = {}
+        for chunk_size, algo in self.combos:
+            key = f"{chunk_size}_{algo}"
+            if key in done:
+                continue
+            count = self.process(path, chunk_size, algo, self.db, self._storage,
+                                 full_hash=file_hash, verbose=False, deltas=self._deltas)
+            if count is not None:
+                segments[key] = count
+            done.add(key)
+
+        self.manifest.save(path, st.st_size, st.st_mtime_ns, st.st_ino, file_hash, done)
+        self.known[path] = (st.st_size, st.st_mtime_ns, st.st_ino, file_hash, done)
+        result.update(
+            status="processed" if segments else "unchanged",
+            file_hash=file_hash,
+            segments=segments,
+            seconds=round(time.time() - start, 4),
+        )
+        return result
+
+    def run(self, roots: list[str], include: list[str], exclude: list[str]):
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        out = []
+        for root in roots:
+            for path, st in walk_files(root, include, exclude):
+                if isinstance(st, OSError):
+                    result = {"path": path, "status": "error", "error": str(st)}
+                else:
+                    try:
+                        result = self.ingest(path, st)
+                    except (OSError, ValueError, psycopg2.Error) as e:
+                        result = {"path": path, "status": "error", "error": str(e)}
+                        self.reset_closed_db()
+                self.totals[result["status"]] += 1
+                out.append(encode(result))
+                # Пропущенные файлы выводим пачками, обработанные - сразу
+                if len(out) >= OUTPUT_BATCH or result["status"] != "skipped":
+                    sys.stdout.write("\n".join(out) + "\n")
+                    sys.stdout.flush()
+                    out.clear()
+        if out:
+            sys.stdout.write("\n".join(out) + "\n")
+        sys.stdout.flush()
+
+    def reset_closed_db(self):
+        """После обрыва соединения следующий файл подключится заново"""
+        if self._db is not None and self._db.conn.closed:
+            self._db = None
+
+    def close(self):
+        self.manifest.close()
+        if self._db is not None:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная загрузка каталогов")
+    parser.add_argument("paths", nargs="+", help="каталоги или файлы")
+    parser.add_argument("--chunk-size", type=int, nargs="+", required=True, choices=CHUNK_SIZES)
+    parser.add_argument("--algo", nargs="+", required=True, choices=HASH_ALGORITHMS)
+    parser.add_argument("--include", nargs="*", default=[], help="шаблоны fnmatch, напр. '*.log'")
+    parser.add_argument("--exclude", nargs="*", default=[], help="шаблоны fnmatch для файлов и каталогов")
+    parser.add_argument("--manifest", default=INGEST_MANIFEST)
+    parser.add_argument("--bulk", action="store_true",
+                        help="пакетная запись метаданных через временные таблицы (process_file_bulk)")
+    args = parser.parse_args()
+
+    combos = [(size, algo) for size in args.chunk_size for algo in args.algo]
+    batch = BatchIngest(combos, Manifest(args.manifest), args.bulk)
+    start = time.time()
+    try:
+        batch.run(args.paths, args.include, args.exclude)
+    finally:
+        batch.close()
+    totals = ", ".join(f"{k}={v}" for k, v in batch.totals.items())
+    print(f"Итого: {totals}, время: {time.time() - start:.2f} сек.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
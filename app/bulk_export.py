@@ -0,0 +1,268 @@
+"""
+Пакетное восстановление / выгрузка многих файлов за один проход по хранилищу.
+
+Рецепты всех файлов берутся одним запросом. Записи хранилища сортируются
+по смещению и читаются окнами по EXPORT_WINDOW_BYTES (близкие записи -
+одним read), каждый сегмент пишется во все позиции выходных файлов,
+где он нужен.
+
+Файлы собираются в памяти пачками по EXPORT_BATCH_BYTES и не больше
+EXPORT_BATCH_ROWS строк рецептов (один проход по хранилищу на пачку) и пишутся
+в каталог или потоком в tar (можно в stdout). Рецепт файла крупнее пачки
+читается серверным курсором: в каталог - частями по EXPORT_BATCH_ROWS строк
+(проход по хранилищу на часть, запись по позициям), в tar - по порядку сегментов.
+
+Запуск:
+    python -m app.bulk_export --chunk-size 1024 --algo sha256 --all --output-dir restored_data
+    python -m app.bulk_export --chunk-size 1024 --algo sha256 --file-id 1 2 3 --tar - > export.tar
+"""
+
+import io
+import os
+import sys
+import time
+import tarfile
+import argparse
+from itertools import islice
+from app.db_manager import DBManager
+from app.storage_manager import StorageManager
+from app.delta import SegmentResolver
+from app.config import (
+    CHUNK_SIZES, HASH_ALGORITHMS, FILE_READ_SIZE,
+    EXPORT_WINDOW_BYTES, EXPORT_MAX_GAP, EXPORT_BATCH_BYTES, EXPORT_BATCH_ROWS, get_postgres_config,
+)
+
+
+class ExportPlan:
+    """
+    План чтения: сегмент хранилища -> позиции в выходных файлах.
+    records: {storage_offset: (segment_size, [(file_index, position), ...])}
+    sizes - конец каждого файла; start - позиция первой строки (часть рецепта одного файла).
+    """
+
+    def __init__(self, rows: list[tuple[int, int, int]], file_ids: list[int], start: int = 0):
+        index = {file_id: i for i, file_id in enumerate(file_ids)}
+        self.records = {}
+        self.sizes = [start] * len(file_ids)
+        for file_id, offset, size in rows:
+            i = index[file_id]
+            record = self.records.get(offset)
+            if record is None:
+                record = self.records[offset] = (size, [])
+            record[1].append((i, self.sizes[i]))
+            self.sizes[i] += size
+
+    def windows(self, window_bytes: int):
+        """Записи по возрастанию смещения, окнами ~window_bytes"""
+        window = []
+        total = 0
+        for offset in sorted(self.records):
+            size, targets = self.records[offset]
+            window.append((offset, size, targets))
+            total += size
+            if total >= window_bytes:
+                yield window
+                window, total = [], 0
+        if window:
+            yield window
+
+
+class BulkExporter:
+    """Выгрузка набора файлов одной пары chunk_size - algo"""
+
+    def __init__(self, db: DBManager, storage: StorageManager, chunk_size: int, algo: str,
+                 window_bytes: int = EXPORT_WINDOW_BYTES, max_gap: int = EXPORT_MAX_GAP):
+        self.db = db
+        self.storage = storage
+        self.chunk_size = chunk_size
+        self.algo = algo
+        self.window_bytes = window_bytes
+        self.max_gap = max_gap
+        self.resolver = SegmentResolver(db, storage)
+        self.bytes_written = 0
+
+    @property
+    def bytes_read(self) -> int:
+        """Прочитано из хранилища (записи дельт и их базы - по длине записи)"""
+        return self.resolver.bytes_read
+
+    def plan(self, file_ids: list[int]) -> ExportPlan:
+        return ExportPlan(self.db.get_files_recipes(file_ids, self.chunk_size, self.algo), file_ids)
+
+    def scan(self, plan: ExportPlan):
+        """Один проход по хранилищу: (data, [(file_index, position), ...]) для каждой записи"""
+        for window in plan.windows(self.window_bytes):
+            spans = [(offset, size) for offset, size, _ in window]
+            loaded = self.resolver.read(self.chunk_size, spans, self.max_gap)
+            for (_, _, targets), data in zip(window, loaded):
+                yield data, targets
+
+    @staticmethod
+    def output_names(files: list[tuple[int, str, int]]) -> list[str]:
+        """Имена в выгрузке: file_name, при совпадении имён - '{file_id}_{file_name}'"""
+        counts = {}
+        for _, name, _ in files:
+            counts[name] = counts.get(name, 0) + 1
+        return [name if counts[name] == 1 else f"{file_id}_{name}" for file_id, name, _ in files]
+
+    def batches(self, files: list[tuple[int, str, int]], batch_bytes: int, batch_rows: int):
+        """
+        Пачки индексов файлов суммарным размером до batch_bytes и до batch_rows строк рецептов.
+        Файл крупнее любого из лимитов - отдельная пачка с флагом large.
+        """
+        batch, batch_size, batch_count = [], 0, 0
+        for i, (_, _, size) in enumerate(files):
+            rows = -(-size // self.chunk_size)
+            if size > batch_bytes or rows > batch_rows:
+                yield [i], True
+                continue
+            if batch and (batch_size + size > batch_bytes or batch_count + rows > batch_rows):
+                yield batch, False
+                batch, batch_size, batch_count = [], 0, 0
+            batch.append(i)
+            batch_size += size
+            batch_count += rows
+        if batch:
+            yield batch, False
+
+    def assemble(self, file_ids: list[int]) -> list[bytearray]:
+        """Собрать файлы в памяти за один проход по хранилищу"""
+        plan = self.plan(file_ids)
+        buffers = [bytearray(size) for size in plan.sizes]
+        for data, targets in self.scan(plan):
+            for i, position in targets:
+                buffers[i][position:position + len(data)] = data
+        return buffers
+
+    def export_to_dir(self, files: list[tuple[int, str, int]], out_dir: str,
+                      batch_bytes: int = EXPORT_BATCH_BYTES, batch_rows: int = EXPORT_BATCH_ROWS) -> list[str]:
+        """Восстановить файлы [(file_id, file_name, file_size), ...] в каталог"""
+        os.makedirs(out_dir, exist_ok=True)
+        paths = [os.path.join(out_dir, name) for name in self.output_names(files)]
+        for batch, large in self.batches(files, batch_bytes, batch_rows):
+            if large:
+                self._write_large(files[batch[0]][0], paths[batch[0]], batch_rows)
+                continue
+            buffers = self.assemble([files[i][0] for i in batch])
+            for i, buf in zip(batch, buffers):
+                with open(paths[i], "wb") as f:
+                    f.write(buf)
+                self.bytes_written += len(buf)
+        return paths
+
+    def _write_large(self, file_id: int, path: str, batch_rows: int):
+        """
+        Файл крупнее пачки: рецепт - серверным курсором частями по batch_rows строк,
+        на каждую часть один проход по хранилищу, сегменты пишутся по позициям.
+        """
+        rows = self.db.iter_file_recipe(file_id, self.chunk_size, self.algo)
+        position = 0
+        with open(path, "wb") as f:
+            while part := list(islice(rows, batch_rows)):
+                plan = ExportPlan(part, [file_id], position)
+                for data, targets in self.scan(plan):
+                    for _, pos in targets:
+                        f.seek(pos)
+                        f.write(data)
+                        self.bytes_written += len(data)
+                position = plan.sizes[0]
+
+    def export_to_tar(self, files: list[tuple[int, str, int]], fileobj,
+                      batch_bytes: int = EXPORT_BATCH_BYTES, batch_rows: int = EXPORT_BATCH_ROWS):
+        """Потоковый tar: файлы собираются в памяти пачками, крупные - читаются по рецепту"""
+        names = self.output_names(files)
+        mtime = int(time.time())
+        with tarfile.open(fileobj=fileobj, mode="w|") as tar:
+            for batch, large in self.batches(files, batch_bytes, batch_rows):
+                if large:
+                    self._tar_large(tar, files[batch[0]], names[batch[0]], mtime)
+                    continue
+                buffers = self.assemble([files[i][0] for i in batch])
+                for i, buf in zip(batch, buffers):
+                    info = tarfile.TarInfo(names[i])
+                    info.size = len(buf)
+                    info.mtime = mtime
+                    tar.addfile(info, io.BytesIO(buf))
+                    self.bytes_written += len(buf)
+
+    def _tar_large(self, tar: tarfile.TarFile, entry: tuple, name: str, mtime: int):
+        """Размер - из files, рецепт - серверным курсором; неполный рецепт - ошибка tarfile"""
+        file_id, _, file_size = entry
+        info = tarfile.TarInfo(name)
+        info.size = file_size
+        info.mtime = mtime
+        tar.addfile(info, RecipeStream(self, self.db.iter_file_recipe(file_id, self.chunk_size, self.algo)))
+        self.bytes_written += info.size
+
+
+class RecipeStream(io.RawIOBase):
+    """Файл, читаемый последовательно по рецепту (для файлов крупнее пачки tar)"""
+
+    def __init__(self, exporter: BulkExporter, rows):
+        """rows - итератор (file_id, storage_offset, segment_size), см. DBManager.iter_file_recipe"""
+        self.exporter = exporter
+        self.rows = rows
+        self.buffer = b""
+        self.batch = max(1, FILE_READ_SIZE // exporter.chunk_size)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer:
+            rows = list(islice(self.rows, self.batch))
+            if not rows:
+                break
+            spans = [(offset, size) for _, offset, size in rows]
+            self.buffer = b"".join(self.exporter.resolver.read(self.exporter.chunk_size, spans))
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное восстановление файлов за один проход по хранилищу")
+    parser.add_argument("--chunk-size", type=int, required=True, choices=CHUNK_SIZES)
+    parser.add_argument("--algo", required=True, choices=HASH_ALGORITHMS)
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--file-id", type=int, nargs="+")
+    selection.add_argument("--all", action="store_true", help="все файлы, обработанные этой парой")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir")
+    output.add_argument("--tar", help="путь к архиву или '-' для stdout")
+    args = parser.parse_args()
+
+    db = DBManager(get_postgres_config())
+    try:
+        files = db.list_processed_files(args.chunk_size, args.algo)
+        if args.file_id:
+            wanted = set(args.file_id)
+            files = [f for f in files if f[0] in wanted]
+            missing = wanted - {f[0] for f in files}
+            if missing:
+                print(f"Не обработаны парой {args.chunk_size}_{args.algo}: {sorted(missing)}", file=sys.stderr)
+        if not files:
+            print("Нет файлов для выгрузки", file=sys.stderr)
+            return
+
+        exporter = BulkExporter(db, StorageManager(), args.chunk_size, args.algo)
+        start = time.time()
+        if args.output_dir:
+            exporter.export_to_dir(files, args.output_dir)
+        elif args.tar == "-":
+            exporter.export_to_tar(files, sys.stdout.buffer)
+        else:
+            with open(args.tar, "wb") as f:
+                exporter.export_to_tar(files, f)
+        elapsed = time.time() - start
+
+        print(f"Выгружено файлов: {len(files)}, {exporter.bytes_written:,} байт "
+              f"(прочитано из хранилища {exporter.bytes_read:,} байт) "
+              f"за {elapsed:.2f} сек.", file=sys.stderr)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
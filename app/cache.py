@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+# Оценка накладных расходов на запись кэша (ключ, bytes, узел OrderedDict)
+CACHE_ENTRY_OVERHEAD = 120
+
+
+class LRUCache:
+    """LRU-кэш с лимитом по суммарному размеру значений (потокобезопасный)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+            self._items[key] = (value, size)
+            self.used += size
+            while self.used > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.used -= evicted
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "bytes": self.used,
+                "hits": self.hits, "misses": self.misses}
@@ -24,3 +24,53 @@ def get_postgres_config() -> dict:
         "password": os.getenv("POSTGRES_PASSWORD"),
         "options": "-c client_encoding=UTF8",
     }
+
+
+# Сервер восстановления (app.restore_server)
+RESTORE_HOST = os.getenv("RESTORE_HOST", "127.0.0.1")
+RESTORE_PORT = int(os.getenv("RESTORE_PORT", 8080))
+
+# Лимиты общих кэшей сервера, байт
+SEGMENT_CACHE_BYTES = int(os.getenv("SEGMENT_CACHE_BYTES", 256 * 1024 * 1024))
+RECIPE_CACHE_BYTES = int(os.getenv("RECIPE_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Локальный манифест пакетной загрузки: (path, size, mtime, inode) -> file_hash
+INGEST_MANIFEST = os.getenv("INGEST_MANIFEST", "data_storage/ingest_manifest.db")
+
+# Дельта-кодирование похожих сегментов (app.delta)
+# Размеры сегментов, для которых ищем похожие базовые сегменты
+DELTA_CHUNK_SIZES = [1024]
+
+# Максимальная длина цепочки дельт при восстановлении
+DELTA_MAX_DEPTH = int(os.getenv("DELTA_MAX_DEPTH", 4))
+
+# Дельта сохраняется, только если она не больше этой доли исходного сегмента
+DELTA_MAX_RATIO = float(os.getenv("DELTA_MAX_RATIO", 0.5))
+
+# Лимит кэша декодированных базовых сегментов, байт
+DELTA_CACHE_BYTES = int(os.getenv("DELTA_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Пакетная выгрузка (app.bulk_export)
+# Сколько байт хранилища читается за одно окно
+EXPORT_WINDOW_BYTES = int(os.getenv("EXPORT_WINDOW_BYTES", 64 * 1024 * 1024))
+
+# Разрыв между записями, который выгоднее прочитать, чем пропустить seek'ом
+EXPORT_MAX_GAP = int(os.getenv("EXPORT_MAX_GAP", 256 * 1024))
+
+# Память под сборку файлов за один проход по хранилищу
+EXPORT_BATCH_BYTES = int(os.getenv("EXPORT_BATCH_BYTES", 256 * 1024 * 1024))
+
+# Строк рецепта в плане одного прохода (план - объекты Python на каждую строку)
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 1000000))
+
+# Секционирование таблиц метаданных (app.init_db --partitioned)
+PARTITIONED_SCHEMA = os.getenv("PARTITIONED_SCHEMA", "0") == "1"
+METADATA_PARTITIONS = int(os.getenv("METADATA_PARTITIONS", 16))
+
+# file_chunks при секционировании: блоки по RECIPE_BLOCK_FILES file_id,
+# рецепт от FILE_PARTITION_MIN_ROWS строк - в своей секции (удаляется DROP)
+RECIPE_BLOCK_FILES = int(os.getenv("RECIPE_BLOCK_FILES", 1000))
+FILE_PARTITION_MIN_ROWS = int(os.getenv("FILE_PARTITION_MIN_ROWS", 100000))
+
+# Пакетная загрузка метаданных через временные таблицы: строк рецепта за один сброс
+BULK_FLUSH_ROWS = int(os.getenv("BULK_FLUSH_ROWS", 100000))
@@ -1,5 +1,8 @@
+import io
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from app.config import FILE_PARTITION_MIN_ROWS, RECIPE_BLOCK_FILES
 
 class DBManager:
     def __init__(self, config):
@@ -69,6 +72,36 @@ class DBManager:
             return row[0] if row else None
 
 
+    def get_file(self, file_id: int) -> tuple | None:
+        """Запись файла по file_id: (file_id, file_name, file_size, processing_done)"""
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "SELECT file_id, file_name, file_size, processing_done FROM files WHERE file_id = %s",
+                (file_id,),
+            )
+            return cur.fetchone()
+
+
+    def get_file_by_name(self, file_name: str) -> tuple | None:
+        """Последняя зарегистрированная запись файла с таким именем"""
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT file_id, file_name, file_size, processing_done FROM files
+                WHERE file_name = %s ORDER BY file_id DESC LIMIT 1
+                """,
+                (file_name,),
+            )
+            return cur.fetchone()
+
+
+    def list_files(self) -> list[tuple]:
+        """Все файлы: [(file_id, file_name, file_size, processing_done), ...]"""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT file_id, file_name, file_size, processing_done FROM files ORDER BY file_id")
+            return cur.fetchall()
+
+
     # Сегменты
 
     def get_segment_offset(self, chunk_size: int, algo: str, segment_hash: str) -> int:
@@ -151,6 +184,96 @@ class DBManager:
     
 
 
+    def iter_file_recipe(self, file_id: int, chunk_size: int, algo: str,
+                         batch: int = 10000):
+        """
+        Рецепт файла потоком: (file_id, storage_offset, segment_size) по порядку chunk_index.
+        Серверный курсор, строки забираются пачками по batch - хэши сегментов
+        и весь рецепт целиком в память не загружаются.
+        """
+        fc = sql.Identifier(f"file_chunks_{self._suffix(chunk_size, algo)}")
+        us = sql.Identifier(f"unique_segments_{self._suffix(chunk_size, algo)}")
+
+        # WITH HOLD - именованный курсор при autocommit
+        with self.conn.cursor(name=f"recipe_{file_id}_{chunk_size}_{algo}", withhold=True) as cur:
+            cur.execute(
+                sql.SQL("""
+                    SELECT fc.file_id, us.storage_offset, us.segment_size
+                    FROM {fc} fc
+                    JOIN {us} us ON fc.segment_hash = us.segment_hash
+                    WHERE fc.file_id = %s
+                    ORDER BY fc.chunk_index ASC
+                """).format(fc=fc, us=us),
+                (file_id,),
+            )
+            while rows := cur.fetchmany(batch):
+                yield from rows
+
+
+    def get_recipe_window(self, file_id: int, chunk_size: int, algo: str,
+                          first: int, last: int) -> list[tuple[int, int]]:
+        """
+        Часть рецепта: сегменты first..last (chunk_index) файла.
+        Возвращает [(storage_offset, segment_size), ...] по порядку chunk_index.
+        Строки file_chunks - по первичному ключу (file_id, chunk_index); сегменты - по
+        ключу unique_segments через = ANY: при обычном JOIN планировщик выбирает
+        полный просмотр unique_segments уже для окна в тысячу строк.
+        """
+        fc = sql.Identifier(f"file_chunks_{self._suffix(chunk_size, algo)}")
+        us = sql.Identifier(f"unique_segments_{self._suffix(chunk_size, algo)}")
+
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("""
+                    WITH part AS MATERIALIZED (
+                        SELECT chunk_index, segment_hash FROM {fc}
+                        WHERE file_id = %s AND chunk_index BETWEEN %s AND %s
+                    )
+                    SELECT us.storage_offset, us.segment_size
+                    FROM part
+                    JOIN {us} us ON us.segment_hash = part.segment_hash
+                    WHERE us.segment_hash = ANY(ARRAY(SELECT segment_hash FROM part))
+                    ORDER BY part.chunk_index ASC
+                """).format(fc=fc, us=us),
+                (file_id, first, last),
+            )
+            return cur.fetchall()
+
+
+    def get_files_recipes(self, file_ids: list[int], chunk_size: int, algo: str) -> list[tuple[int, int, int]]:
+        """
+        Рецепты нескольких файлов одним запросом.
+        Возвращает [(file_id, storage_offset, segment_size), ...]
+        по порядку file_id, chunk_index.
+        """
+        fc = sql.Identifier(f"file_chunks_{self._suffix(chunk_size, algo)}")
+        us = sql.Identifier(f"unique_segments_{self._suffix(chunk_size, algo)}")
+
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("""
+                    SELECT fc.file_id, us.storage_offset, us.segment_size
+                    FROM {fc} fc
+                    JOIN {us} us ON fc.segment_hash = us.segment_hash
+                    WHERE fc.file_id = ANY(%s)
+                    ORDER BY fc.file_id, fc.chunk_index
+                """).format(fc=fc, us=us),
+                (list(file_ids),),
+            )
+            return cur.fetchall()
+
+
+    def list_processed_files(self, chunk_size: int, algo: str) -> list[tuple[int, str, int]]:
+        """Файлы, обработанные парой chunk_size - algo: [(file_id, file_name, file_size), ...]"""
+        key = self._suffix(chunk_size, algo)
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "SELECT file_id, file_name, file_size FROM files WHERE %s = ANY(processing_done) ORDER BY file_id",
+                (key,),
+            )
+            return cur.fetchall()
+
+
     def get_storage_offset(self, chunk_size: int, content_hash: str) -> tuple | None:
         """Проверить: записан ли сегмент в хранилище? Возвращает (offset, size) или None."""
         table = sql.Identifier(f"storage_index_{chunk_size}")
@@ -177,5 +300,299 @@ class DBManager:
                 (content_hash, storage_offset, segment_size),
             )
         
+    # Пакетная загрузка
+
+    def get_storage_offsets(self, chunk_size: int, content_hashes: list[str]) -> dict[str, tuple[int, int]]:
+        """Позиции сразу многих сегментов: {content_hash: (storage_offset, segment_size)}"""
+        if not content_hashes:
+            return {}
+        table = sql.Identifier(f"storage_index_{chunk_size}")
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("SELECT content_hash, storage_offset, segment_size FROM {table} WHERE content_hash = ANY(%s)")
+                .format(table=table),
+                (list(content_hashes),),
+            )
+            return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+    def save_storage_index_many(self, chunk_size: int, rows: list[tuple[str, int, int]]):
+        """Записать в индекс хранилища много строк (content_hash, storage_offset, segment_size)"""
+        if not rows:
+            return
+        table = sql.Identifier(f"storage_index_{chunk_size}")
+        with self.conn.cursor() as cur:
+            execute_values(
+                cur,
+                sql.SQL("""
+                    INSERT INTO {table} (content_hash, storage_offset, segment_size) VALUES %s
+                    ON CONFLICT DO NOTHING
+                """).format(table=table).as_string(cur),
+                rows,
+            )
+
+
+    def bulk_load_file_chunks(self, chunk_size: int, algo: str, file_id: int,
+                              recipe: list[tuple[int, str]], segments: dict[str, list[int]],
+                              own_partition: bool = False):
+        """
+        Пакетная запись части рецепта файла.
+        recipe   - [(chunk_index, segment_hash), ...]
+        segments - {segment_hash: [segment_size, storage_offset, count]}
+
+        Сегменты - COPY во временную (нежурналируемую) таблицу и один upsert
+        unique_segments (repits += count); индекс unique_segments при этом
+        обновляется построчно.
+        own_partition=False: рецепт - COPY во временную таблицу и одна вставка
+        в file_chunks (индекс и внешние ключи проверяются построчно).
+        own_partition=True: рецепт - COPY прямо в отдельную таблицу файла без
+        индексов и ограничений (prepare_recipe_partition(detached=True)),
+        ключ и внешние ключи проверяются один раз в attach_recipe_partition.
+        """
+        suffix = self._suffix(chunk_size, algo)
+        fc = sql.Identifier(f"file_chunks_{suffix}")
+        us = sql.Identifier(f"unique_segments_{suffix}")
+
+        chunks_data = io.StringIO("".join(f"{file_id}\t{idx}\t{seg_hash}\n" for idx, seg_hash in recipe))
+        segments_data = io.StringIO("".join(
+            f"{seg_hash}\t{size}\t{offset}\t{count}\n" for seg_hash, (size, offset, count) in segments.items()
+        ))
+
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS stage_file_chunks (
+                    file_id INTEGER, chunk_index INTEGER, segment_hash TEXT
+                ) ON COMMIT DELETE ROWS;
+                CREATE TEMP TABLE IF NOT EXISTS stage_unique_segments (
+                    segment_hash TEXT, segment_size INTEGER, storage_offset BIGINT, repits INTEGER
+                ) ON COMMIT DELETE ROWS;
+            """)
+            cur.execute("BEGIN")
+            try:
+                cur.copy_expert("COPY stage_unique_segments FROM STDIN", segments_data)
+                cur.execute(sql.SQL("""
+                    INSERT INTO {us} AS us (segment_hash, segment_size, storage_offset, repits)
+                    SELECT segment_hash, segment_size, storage_offset, repits
+                    FROM stage_unique_segments ORDER BY segment_hash
+                    ON CONFLICT (segment_hash) DO UPDATE SET repits = us.repits + EXCLUDED.repits
+                """).format(us=us))
+                if own_partition:
+                    own = sql.Identifier(f"file_chunks_{suffix}_f{file_id}")
+                    cur.copy_expert(
+                        sql.SQL("COPY {own} (file_id, chunk_index, segment_hash) FROM STDIN")
+                        .format(own=own).as_string(cur),
+                        chunks_data,
+                    )
+                else:
+                    cur.copy_expert("COPY stage_file_chunks FROM STDIN", chunks_data)
+                    cur.execute(sql.SQL("""
+                        INSERT INTO {fc} (file_id, chunk_index, segment_hash)
+                        SELECT file_id, chunk_index, segment_hash
+                        FROM stage_file_chunks ORDER BY file_id, chunk_index
+                    """).format(fc=fc))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+
+    # Секционирование рецептов (app.init_db --partitioned)
+
+    def prepare_recipe_partition(self, chunk_size: int, algo: str, file_id: int, rows: int,
+                                 detached: bool = False, min_rows: int = FILE_PARTITION_MIN_ROWS) -> bool:
+        """
+        Подготовить секции file_chunks под рецепт файла из rows строк.
+        Блок file_id (RANGE по RECIPE_BLOCK_FILES файлов, внутри - LIST по file_id)
+        с общей секцией по умолчанию для мелких файлов создаётся при первом файле блока.
+        Рецепт от min_rows строк получает свою секцию file_chunks_{size}_{algo}_f{file_id}:
+        detached=True - отдельная таблица без индексов для COPY (потом attach_recipe_partition),
+        иначе - сразу присоединённая пустая секция.
+        Своя секция от прерванной загрузки удаляется через remove_file_recipe - с возвратом
+        repits, уже добавленных её строками (строки в общей секции вызывающий удаляет сам).
+        Возвращает True, если у файла своя секция; для несекционированной схемы - False.
+        """
+        fc = f"file_chunks_{self._suffix(chunk_size, algo)}"
+        block_no = file_id // RECIPE_BLOCK_FILES
+        block = f"{fc}_b{block_no}"
+        own_name = f"{fc}_f{file_id}"
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT relkind = 'p', to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL
+                FROM pg_class WHERE oid = to_regclass(%s)
+                """,
+                (block, own_name, fc),
+            )
+            row = cur.fetchone()
+            if row is None or not row[0]:
+                return False
+            if row[2]:
+                self.remove_file_recipe(file_id, chunk_size, algo)
+            if not row[1]:
+                cur.execute(sql.SQL("""
+                    CREATE TABLE IF NOT EXISTS {block} PARTITION OF {fc}
+                    FOR VALUES FROM ({start}) TO ({end}) PARTITION BY LIST (file_id);
+                    CREATE TABLE IF NOT EXISTS {small} PARTITION OF {block} DEFAULT;
+                """).format(block=sql.Identifier(block), fc=sql.Identifier(fc),
+                            small=sql.Identifier(f"{block}_small"),
+                            start=sql.Literal(block_no * RECIPE_BLOCK_FILES),
+                            end=sql.Literal((block_no + 1) * RECIPE_BLOCK_FILES)))
+            if rows < min_rows:
+                return False
+
+            own = sql.Identifier(own_name)
+            if detached:
+                cur.execute(sql.SQL("CREATE TABLE {own} (LIKE {fc})").format(own=own, fc=sql.Identifier(fc)))
+            else:
+                cur.execute(sql.SQL("CREATE TABLE {own} PARTITION OF {block} FOR VALUES IN ({file_id})")
+                            .format(own=own, block=sql.Identifier(block), file_id=sql.Literal(file_id)))
+        return True
+
+
+    def attach_recipe_partition(self, chunk_size: int, algo: str, file_id: int):
+        """
+        Присоединить загруженную таблицу рецепта файла к его блоку.
+        Первичный ключ строится одной сортировкой, CHECK избавляет ATTACH от проверки
+        строк таблицы, внешние ключи родителя проверяются одним запросом.
+        Просматривается только общая секция блока (нет ли там строк этого file_id).
+        """
+        fc = f"file_chunks_{self._suffix(chunk_size, algo)}"
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("""
+                    ALTER TABLE {own} ADD PRIMARY KEY (file_id, chunk_index), ADD CHECK (file_id = {file_id});
+                    ALTER TABLE {block} ATTACH PARTITION {own} FOR VALUES IN ({file_id});
+                """).format(own=sql.Identifier(f"{fc}_f{file_id}"),
+                            block=sql.Identifier(f"{fc}_b{file_id // RECIPE_BLOCK_FILES}"),
+                            file_id=sql.Literal(file_id)),
+            )
+
+
+    def remove_file_recipe(self, file_id: int, chunk_size: int, algo: str) -> int:
+        """
+        Удалить рецепт файла для пары chunk_size - algo и уменьшить repits его сегментов.
+        Рецепт в своей секции (prepare_recipe_partition) удаляется DROP TABLE - без
+        мёртвых строк в file_chunks; иначе - DELETE (в секционированной схеме - только
+        в общей секции блока). repits обновляется по строке на каждый различный сегмент.
+        Сегменты остаются в хранилище. Возвращает число удалённых строк рецепта.
+        """
+        key = self._suffix(chunk_size, algo)
+        fc = sql.Identifier(f"file_chunks_{key}")
+        us = sql.Identifier(f"unique_segments_{key}")
+        own_name = f"file_chunks_{key}_f{file_id}"
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (own_name,))
+            own_partition = cur.fetchone()[0]
+            if own_partition:
+                removed_rows = sql.SQL("SELECT segment_hash FROM {own}").format(own=sql.Identifier(own_name))
+            else:
+                removed_rows = sql.SQL("DELETE FROM {fc} WHERE file_id = %s RETURNING segment_hash").format(fc=fc)
+
+            cur.execute("BEGIN")
+            try:
+                cur.execute(
+                    sql.SQL("""
+                        WITH removed AS (
+                            {removed_rows}
+                        ), counts AS (
+                            SELECT segment_hash, COUNT(*) AS cnt FROM removed GROUP BY segment_hash
+                        ), updated AS (
+                            UPDATE {us} us SET repits = us.repits - counts.cnt
+                            FROM counts WHERE us.segment_hash = counts.segment_hash
+                        )
+                        SELECT COALESCE(SUM(cnt), 0) FROM counts
+                    """).format(removed_rows=removed_rows, us=us),
+                    None if own_partition else (file_id,),
+                )
+                removed = cur.fetchone()[0]
+                if own_partition:
+                    cur.execute(sql.SQL("DROP TABLE {own}").format(own=sql.Identifier(own_name)))
+                cur.execute(
+                    "UPDATE files SET processing_done = array_remove(processing_done, %s) WHERE file_id = %s",
+                    (key, file_id),
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            return int(removed)
+
+
+    # Дельта-кодирование
+
+    def save_delta(self, chunk_size: int, storage_offset: int, base_offset: int,
+                   base_size: int, raw_size: int, delta_size: int, depth: int):
+        """Записать, что сегмент по storage_offset - дельта длиной delta_size к сегменту по base_offset"""
+        table = sql.Identifier(f"segment_deltas_{chunk_size}")
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("""
+                    INSERT INTO {table} (storage_offset, base_offset, base_size, raw_size, delta_size, depth)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                """).format(table=table),
+                (storage_offset, base_offset, base_size, raw_size, delta_size, depth),
+            )
+
+
+    def get_delta_chains(self, chunk_size: int, offsets: list[int]) -> dict[int, tuple[int, int, int]]:
+        """
+        Дельты для offsets вместе со всеми их базами по цепочке.
+        Возвращает {storage_offset: (base_offset, base_size, delta_size)}.
+        """
+        if not offsets:
+            return {}
+        table = sql.Identifier(f"segment_deltas_{chunk_size}")
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("""
+                    WITH RECURSIVE chain AS (
+                        SELECT storage_offset, base_offset, base_size, delta_size
+                        FROM {table} WHERE storage_offset = ANY(%s)
+                        UNION
+                        SELECT d.storage_offset, d.base_offset, d.base_size, d.delta_size
+                        FROM {table} d JOIN chain c ON d.storage_offset = c.base_offset
+                    )
+                    SELECT storage_offset, base_offset, base_size, delta_size FROM chain
+                """).format(table=table),
+                (list(offsets),),
+            )
+            return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+    def find_similar_segments(self, chunk_size: int, features: list[int], limit: int) -> list[tuple[int, int, int]]:
+        """
+        Кандидаты в базу для дельты: сегменты с общими суперпризнаками.
+        Возвращает [(storage_offset, stored_size, depth), ...], больше совпадений - выше.
+        """
+        table = sql.Identifier(f"similarity_index_{chunk_size}")
+        with self.conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("""
+                    SELECT storage_offset, stored_size, depth
+                    FROM {table} WHERE feature = ANY(%s)
+                    GROUP BY storage_offset, stored_size, depth
+                    ORDER BY COUNT(*) DESC, depth ASC
+                    LIMIT %s
+                """).format(table=table),
+                (features, limit),
+            )
+            return cur.fetchall()
+
+
+    def save_features(self, chunk_size: int, features: list[int], storage_offset: int,
+                      stored_size: int, depth: int):
+        """Добавить сегмент в индекс похожести (первый сегмент с признаком остаётся базой)"""
+        table = sql.Identifier(f"similarity_index_{chunk_size}")
+        with self.conn.cursor() as cur:
+            cur.executemany(
+                sql.SQL("""
+                    INSERT INTO {table} (feature, storage_offset, stored_size, depth)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                """).format(table=table),
+                [(f, storage_offset, stored_size, depth) for f in features],
+            )
+
     def close(self):
         self.conn.close()
\ No newline at end of file
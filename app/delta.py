@@ -0,0 +1,251 @@
+"""
+Дельта-кодирование похожих сегментов.
+
+Сегменты нарезаются фиксированно, поэтому похожие сегменты отличаются
+заменой байт «на месте» (метки времени, счётчики), а не сдвигом.
+
+Признаки: хэши выровненных подблоков по SUB_BLOCK байт.
+Суперпризнаки: SF_COUNT значений MinHash по этим признакам - у сегментов,
+совпадающих по большинству подблоков, часть суперпризнаков совпадает.
+
+Формат дельты: varint(raw_size), затем пары
+    varint(copy) - скопировать copy байт базы с текущей позиции
+    varint(lit), lit байт - заменить следующие lit байт литералами
+"""
+
+import time
+import hashlib
+from app.cache import LRUCache, CACHE_ENTRY_OVERHEAD
+from app.config import DELTA_CHUNK_SIZES, DELTA_MAX_DEPTH, DELTA_MAX_RATIO, DELTA_CACHE_BYTES
+
+# Размер подблока для признаков и для сравнения с базой
+SUB_BLOCK = 64
+
+# Число суперпризнаков на сегмент
+SF_COUNT = 4
+
+# Сколько кандидатов в базу проверять
+DELTA_CANDIDATES = 2
+
+# Литеральные участки, между которыми меньше MERGE_GAP совпадающих байт, склеиваются
+MERGE_GAP = 3
+
+# Простое 2^61 - 1: значения MinHash помещаются в BIGINT
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"sf{i}a".encode()).digest()[:8], "big") % _PRIME | 1,
+     int.from_bytes(hashlib.sha256(f"sf{i}b".encode()).digest()[:8], "big") % _PRIME)
+    for i in range(SF_COUNT)
+]
+
+
+def super_features(data: bytes) -> list[int]:
+    """SF_COUNT значений MinHash по хэшам выровненных подблоков"""
+    blake = hashlib.blake2b
+    features = {
+        int.from_bytes(blake(data[i:i + SUB_BLOCK], digest_size=8).digest(), "big")
+        for i in range(0, len(data), SUB_BLOCK)
+    }
+    # Номер суперпризнака в младших битах - одинаковые значения разных перестановок не путаются
+    return [
+        (min((a * f + b) % _PRIME for f in features) & ~(SF_COUNT - 1)) | i
+        for i, (a, b) in enumerate(_PERMUTATIONS)
+    ]
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_delta(base: bytes, target: bytes) -> bytes:
+    """Дельта target относительно base (замены на месте + хвост литералами)"""
+    n = len(target)
+    common = min(len(base), n)
+    runs = []
+
+    def mark(start, end):
+        if runs and start - runs[-1][1] <= MERGE_GAP:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    for block in range(0, common, SUB_BLOCK):
+        end = min(block + SUB_BLOCK, common)
+        if base[block:end] == target[block:end]:
+            continue
+        for i in range(block, end):
+            if base[i] != target[i]:
+                mark(i, i + 1)
+    if n > common:
+        mark(common, n)
+
+    out = bytearray(_varint(n))
+    pos = 0
+    for start, end in runs:
+        out += _varint(start - pos)
+        out += _varint(end - start)
+        out += target[start:end]
+        pos = end
+    if pos < n:
+        out += _varint(n - pos)
+        out += _varint(0)
+    return bytes(out)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Восстановить сегмент из базы и дельты"""
+    n, p = _read_varint(delta, 0)
+    out = bytearray()
+    pos = 0
+    while p < len(delta):
+        copy, p = _read_varint(delta, p)
+        out += base[pos:pos + copy]
+        pos += copy
+        lit, p = _read_varint(delta, p)
+        out += delta[p:p + lit]
+        p += lit
+        pos += lit
+    if len(out) != n:
+        raise ValueError(f"Повреждённая дельта: {len(out)} байт вместо {n}")
+    return bytes(out)
+
+
+class SegmentResolver:
+    """
+    Чтение сегментов из хранилища с раскрытием цепочек дельт.
+    Декодированные сегменты кэшируются по (chunk_size, storage_offset).
+    """
+
+    def __init__(self, db, storage, cache: LRUCache | None = None):
+        self.db = db
+        self.storage = storage
+        self.cache = cache if cache is not None else LRUCache(DELTA_CACHE_BYTES)
+        self.decoded = 0
+        self.bytes_read = 0
+        self.time_decode = 0.0
+
+    def read(self, chunk_size: int, spans: list[tuple[int, int]], max_gap: int = 0,
+             chains: dict | None = None) -> list[bytes]:
+        """
+        Исходные данные сегментов [(storage_offset, segment_size), ...].
+        Длина записи дельты берётся из segment_deltas (delta_size).
+        max_gap - см. StorageManager.read_segments.
+        chains - уже полученный get_delta_chains для всех spans (иначе запрашивается здесь).
+        """
+        if chunk_size not in DELTA_CHUNK_SIZES:
+            self.bytes_read += sum(size for _, size in spans)
+            return self.storage.read_segments(chunk_size, spans, max_gap)
+
+        if chains is None:
+            result = [self.cache.get((chunk_size, offset)) for offset, _ in spans]
+        else:
+            # Кэш уже проверен вызывающим; цепочки получены ровно для этих spans
+            result = [None] * len(spans)
+        missing = [span for span, data in zip(spans, result) if data is None]
+        if not missing:
+            return result
+
+        # Все записи, нужные для декодирования: сами сегменты и базы по цепочкам
+        if chains is None:
+            chains = self.db.get_delta_chains(chunk_size, [offset for offset, _ in missing])
+        records = {offset: chains[offset][2] if offset in chains else size for offset, size in missing}
+        for base_offset, base_size, _ in chains.values():
+            records.setdefault(base_offset, base_size)
+        offsets = list(records)
+        stored = dict(zip(offsets, self.storage.read_segments(
+            chunk_size, [(offset, records[offset]) for offset in offsets], max_gap)))
+        self.bytes_read += sum(records.values())
+
+        start = time.perf_counter()
+        decoded = {}
+
+        def resolve(offset, depth=0):
+            data = decoded.get(offset)
+            if data is None:
+                data = self.cache.get((chunk_size, offset)) if depth else None
+            if data is not None:
+                return data
+            chain = chains.get(offset)
+            if chain is None:
+                data = stored[offset]
+            else:
+                if depth > DELTA_MAX_DEPTH:
+                    raise ValueError(f"Цепочка дельт длиннее {DELTA_MAX_DEPTH} (offset {offset})")
+                data = apply_delta(resolve(chain[0], depth + 1), stored[offset])
+                self.decoded += 1
+            decoded[offset] = data
+            self.cache.put((chunk_size, offset), data, len(data) + CACHE_ENTRY_OVERHEAD)
+            return data
+
+        for i, (offset, _) in enumerate(spans):
+            if result[i] is None:
+                result[i] = resolve(offset)
+        self.time_decode += time.perf_counter() - start
+        return result
+
+
+class DeltaStore:
+    """Запись нового сегмента в хранилище: дельтой к похожему сегменту или целиком"""
+
+    def __init__(self, db, storage, resolver: SegmentResolver | None = None):
+        self.db = db
+        self.storage = storage
+        self.resolver = resolver or SegmentResolver(db, storage)
+        self.delta_segments = 0
+        self.bytes_saved = 0
+        self.time_delta = 0.0
+
+    def write(self, chunk_size: int, data: bytes) -> int:
+        """
+        Записать сегмент; возвращает storage_offset.
+        segment_size в индексах - всегда len(data), длина дельты - в segment_deltas.
+        """
+        if chunk_size not in DELTA_CHUNK_SIZES:
+            return self.storage.write_segment(chunk_size, data)
+
+        start = time.perf_counter()
+        features = super_features(data)
+        best = None
+        for base_offset, base_size, depth in self.db.find_similar_segments(chunk_size, features, DELTA_CANDIDATES):
+            if depth >= DELTA_MAX_DEPTH:
+                continue
+            # base_size - длина записи: у сырой базы совпадает с segment_size, у дельты её заменит delta_size
+            base = self.resolver.read(chunk_size, [(base_offset, base_size)])[0]
+            delta = encode_delta(base, data)
+            if best is None or len(delta) < len(best[0]):
+                best = (delta, base_offset, base_size, depth + 1)
+
+        if best is not None and len(best[0]) <= len(data) * DELTA_MAX_RATIO:
+            delta, base_offset, base_size, depth = best
+            offset = self.storage.write_segment(chunk_size, delta)
+            self.db.save_delta(chunk_size, offset, base_offset, base_size, len(data), len(delta), depth)
+            stored_size = len(delta)
+            self.delta_segments += 1
+            self.bytes_saved += len(data) - stored_size
+        else:
+            offset = self.storage.write_segment(chunk_size, data)
+            stored_size = len(data)
+            depth = 0
+
+        # Только что записанный сегмент уже декодирован - кладём в кэш как будущую базу
+        self.resolver.cache.put((chunk_size, offset), data, len(data) + CACHE_ENTRY_OVERHEAD)
+        if depth < DELTA_MAX_DEPTH:
+            self.db.save_features(chunk_size, features, offset, stored_size, depth)
+        self.time_delta += time.perf_counter() - start
+        return offset
@@ -1,16 +1,79 @@
 """
 Инициализация схемы БД.
 
+--partitioned: storage_index и unique_segments секционируются по хэшу ключа
+(METADATA_PARTITIONS секций). file_chunks - по диапазонам file_id
+(блоки по RECIPE_BLOCK_FILES файлов, создаются при загрузке, см.
+DBManager.prepare_recipe_partition), внутри блока - по списку file_id:
+рецепт крупного файла лежит в своей секции и удаляется DROP TABLE,
+мелкие файлы блока - в общей секции по умолчанию.
+
+Включить секционирование у существующих таблиц нельзя - create_schema
+проверяет это заранее и ничего не создаёт (см. README).
 """
 import os
 os.environ["PGCLIENTENCODING"] = "UTF8"
 
+import argparse
 import psycopg2
 from psycopg2 import sql
-from app.config import get_postgres_config, CHUNK_SIZES, HASH_ALGORITHMS
+from app.config import (
+    get_postgres_config, CHUNK_SIZES, HASH_ALGORITHMS, DELTA_CHUNK_SIZES,
+    PARTITIONED_SCHEMA, METADATA_PARTITIONS,
+)
+
+
+def create_hash_partitions(cur, table: str, partitions: int):
+    """Секции {table}_p0..p{N-1} секционированной по хэшу таблицы"""
+    for i in range(partitions):
+        cur.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {part} PARTITION OF {table}
+            FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder});
+        """).format(part=sql.Identifier(f"{table}_p{i}"), table=sql.Identifier(table),
+                    modulus=sql.Literal(partitions), remainder=sql.Literal(i)))
+
+
+def check_existing_tables(cur, partitioned: bool):
+    """
+    Уже созданные таблицы должны совпадать по секционированию:
+    CREATE TABLE IF NOT EXISTS молча пропустил бы несекционированную таблицу.
+    """
+    expected = {f"storage_index_{size}": "h" for size in CHUNK_SIZES}
+    for size in CHUNK_SIZES:
+        for algo in HASH_ALGORITHMS:
+            expected[f"unique_segments_{size}_{algo}"] = "h"
+            expected[f"file_chunks_{size}_{algo}"] = "r"
 
+    for table, strategy in expected.items():
+        cur.execute("""
+            SELECT c.relkind, p.partstrat
+            FROM pg_class c LEFT JOIN pg_partitioned_table p ON p.partrelid = c.oid
+            WHERE c.oid = to_regclass(%s)
+        """, (table,))
+        row = cur.fetchone()
+        if row is None:
+            continue
+        relkind, partstrat = row
+        if partitioned and partstrat != strategy:
+            raise RuntimeError(
+                f"Таблица {table} уже существует "
+                f"{'без секционирования' if relkind == 'r' else 'с другим секционированием'}. "
+                "Секционированную схему нужно создавать в новой БД и загружать файлы заново (см. README)"
+            )
+        if not partitioned and relkind == "p":
+            raise RuntimeError(f"Таблица {table} секционирована - запустите init_db с --partitioned")
+
+
+def create_schema(conn, partitioned: bool = PARTITIONED_SCHEMA, partitions: int = METADATA_PARTITIONS):
+
+    with conn.cursor() as cur:
+        check_existing_tables(cur, partitioned)
 
-def create_schema(conn):
+    def partition_by(key, strategy="HASH"):
+        if not partitioned:
+            return sql.SQL("")
+        return sql.SQL("PARTITION BY {strategy} ({key})").format(
+            strategy=sql.SQL(strategy), key=sql.Identifier(key))
     
     # Таблица 1: files - реестр обработанных файлов
     # file_id
@@ -38,8 +101,10 @@ def create_schema(conn):
                                     content_hash TEXT PRIMARY KEY,
                                     storage_offset BIGINT NOT NULL,
                                     segment_size INTEGER NOT NULL
-                                );
-                                """).format(table=sql.Identifier(si)))
+                                ) {partition_by};
+                                """).format(table=sql.Identifier(si), partition_by=partition_by("content_hash")))
+            if partitioned:
+                create_hash_partitions(cur, si, partitions)
             print(f"Таблица для {si} создана")
         
         # Для каждой пары "chunk_size - algo" создаём пару таблиц
@@ -61,8 +126,10 @@ def create_schema(conn):
                         segment_size        INTEGER NOT NULL,
                         storage_offset      BIGINT  NOT NULL,
                         repits              INTEGER NOT NULL DEFAULT 1
-                    );
-                """).format(table=sql.Identifier(us)))
+                    ) {partition_by};
+                """).format(table=sql.Identifier(us), partition_by=partition_by("segment_hash")))
+                if partitioned:
+                    create_hash_partitions(cur, us, partitions)
                 print(f"Таблица для {us} создана")
                 
                 
@@ -71,20 +138,65 @@ def create_schema(conn):
                 # file_id
                 # chunk_index - порядковый номер сегмента (0, 1, 2, ...)
                 # segment_hash  - хэш сегмента, по нему достаём данные из MinIO
+                # При секционировании секции-блоки создаются при загрузке файлов
                 cur.execute(sql.SQL("""
                     CREATE TABLE IF NOT EXISTS {fc} (
                 file_id       INTEGER NOT NULL REFERENCES files(file_id),
                 chunk_index   INTEGER NOT NULL,
                 segment_hash  TEXT    NOT NULL REFERENCES {us}(segment_hash),
-                PRIMARY KEY (file_id, chunk_index));
-                """).format(fc=sql.Identifier(fc), us=sql.Identifier(us)))
+                PRIMARY KEY (file_id, chunk_index)) {partition_by};
+                """).format(fc=sql.Identifier(fc), us=sql.Identifier(us),
+                            partition_by=partition_by("file_id", "RANGE")))
                 
                 print(f"Таблица для {fc} создана")
 
-    tables_count = 1 + len(CHUNK_SIZES) + len(CHUNK_SIZES) * len(HASH_ALGORITHMS) * 2
+        # Таблицы дельта-кодирования для размеров из DELTA_CHUNK_SIZES
+        for size in DELTA_CHUNK_SIZES:
+            # segment_deltas_{size} - сегменты, записанные дельтой к базовому
+            # storage_offset - позиция дельты в хранилище
+            # base_offset, base_size - запись базового сегмента (сама может быть дельтой)
+            # raw_size - размер восстановленного сегмента (он же segment_size в остальных таблицах)
+            # delta_size - длина записи дельты в хранилище
+            # depth - длина цепочки дельт до сырого сегмента
+            sd = f"segment_deltas_{size}"
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    storage_offset  BIGINT   PRIMARY KEY,
+                    base_offset     BIGINT   NOT NULL,
+                    base_size       INTEGER  NOT NULL,
+                    raw_size        INTEGER  NOT NULL,
+                    delta_size      INTEGER  NOT NULL,
+                    depth           SMALLINT NOT NULL
+                );
+            """).format(table=sql.Identifier(sd)))
+            print(f"Таблица для {sd} создана")
+
+            # similarity_index_{size} - суперпризнак -> сегмент-кандидат в базу
+            # stored_size - длина записи в хранилище (у дельты - длина дельты)
+            si = f"similarity_index_{size}"
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    feature         BIGINT   PRIMARY KEY,
+                    storage_offset  BIGINT   NOT NULL,
+                    stored_size     INTEGER  NOT NULL,
+                    depth           SMALLINT NOT NULL
+                );
+            """).format(table=sql.Identifier(si)))
+            print(f"Таблица для {si} создана")
+
+    hash_partitioned = len(CHUNK_SIZES) + len(CHUNK_SIZES) * len(HASH_ALGORITHMS)
+    tables_count = 1 + hash_partitioned + len(CHUNK_SIZES) * len(HASH_ALGORITHMS) + len(DELTA_CHUNK_SIZES) * 2
+    if partitioned:
+        tables_count += hash_partitioned * partitions
     return tables_count
         
 def main():
+    parser = argparse.ArgumentParser(description="Инициализация схемы БД")
+    parser.add_argument("--partitioned", action="store_true", default=PARTITIONED_SCHEMA,
+                        help="секционировать таблицы метаданных по хэшу ключа")
+    parser.add_argument("--partitions", type=int, default=METADATA_PARTITIONS)
+    args = parser.parse_args()
+
     print("Подключение к PostgreSQL...")
     
     try:
@@ -96,8 +208,13 @@ def main():
         return
 
     print("Создание таблиц:")
-    tables_count = create_schema(conn)
-    conn.close()
+    try:
+        tables_count = create_schema(conn, args.partitioned, args.partitions)
+    except RuntimeError as e:
+        print(f"Ошибка: {e}")
+        return
+    finally:
+        conn.close()
 
     print(f"\nГотово: {tables_count} таблиц создано.")
 
@@ -4,7 +4,8 @@ import time
 from dotenv import load_dotenv
 from app.db_manager import DBManager
 from app.storage_manager import StorageManager
-from app.config import CHUNK_SIZES, FILE_READ_SIZE, HASH_ALGORITHMS, get_postgres_config
+from app.delta import DeltaStore, SegmentResolver
+from app.config import CHUNK_SIZES, FILE_READ_SIZE, HASH_ALGORITHMS, BULK_FLUSH_ROWS, INGEST_MANIFEST, get_postgres_config
 
 load_dotenv()
 
@@ -71,22 +72,37 @@ def get_full_file_hash(filepath):
     return hasher.hexdigest()
 
 
-def process_file(filepath, chunk_size, algo, db, storage):
-    """Обработать файл: хэширование, дедупликация"""
+def process_file(filepath, chunk_size, algo, db, storage, full_hash=None, verbose=True, deltas=None):
+    """
+    Обработать файл: хэширование, дедупликация.
+    full_hash - уже посчитанный хэш файла (чтобы не читать файл повторно).
+    deltas - общий DeltaStore (кэш баз между файлами), по умолчанию создаётся новый.
+    Возвращает число сегментов или None, если файл уже был обработан.
+    """
     file_name = os.path.basename(filepath)
     file_size = os.path.getsize(filepath)
-    full_hash = get_full_file_hash(filepath)
+    if full_hash is None:
+        full_hash = get_full_file_hash(filepath)
     
     # 1. Проверка на дубликат всего файла по паре chunk_size-algo
     if db.file_has_processing(full_hash, chunk_size, algo):
-        print(f"Файл '{file_name}' с комбинацией '{chunk_size}_{algo}' уже был обработан ранее!")
-        return file_name
+        if verbose:
+            print(f"Файл '{file_name}' с комбинацией '{chunk_size}_{algo}' уже был обработан ранее!")
+        return None
 
     # 2. Регистрация нового файла
     
     file_id = db.register_file(file_name, full_hash, file_size)
+    # Строки рецепта от прерванной обработки: иначе повторная вставка упрётся
+    # в первичный ключ, а repits их сегментов останутся завышенными
+    db.remove_file_recipe(file_id, chunk_size, algo)
+    # Секции file_chunks под рецепт (только для секционированной схемы)
+    db.prepare_recipe_partition(chunk_size, algo, file_id, -(-file_size // chunk_size))
+    if deltas is None:
+        deltas = DeltaStore(db, storage)
     
-    print(f"Начинаем обработку: {file_name}")
+    if verbose:
+        print(f"Начинаем обработку: {file_name}")
     start_time = time.time()
     
     with open(filepath, "rb") as f:
@@ -110,15 +126,16 @@ def process_file(filepath, chunk_size, algo, db, storage):
             if stored is not None:
                 offset, seg_size = stored
             else:
-                offset = storage.write_segment(chunk_size, chunk_data)
-                db.save_storage_index(chunk_size, content_hash, offset, len(chunk_data))
+                # Новое содержимое: дельтой к похожему сегменту или целиком
+                offset, seg_size = deltas.write(chunk_size, chunk_data), len(chunk_data)
+                db.save_storage_index(chunk_size, content_hash, offset, seg_size)
             
             
             # Запись в таблицу алгоритма отдельно от хранилища
             existing = db.get_segment_offset(chunk_size, algo, seg_hash)
             if existing is None:
                 # Новый уникальный сегмент для этого алгоритма
-                db.save_segment(chunk_size, algo, seg_hash, offset, len(chunk_data))
+                db.save_segment(chunk_size, algo, seg_hash, offset, seg_size)
             else:
                 # Дубликат сегмента
                 db.increment_ref_count(chunk_size, algo, seg_hash)
@@ -126,11 +143,93 @@ def process_file(filepath, chunk_size, algo, db, storage):
             # Сохраняем структуру
             db.save_file_structure(chunk_size, algo, file_id, idx, seg_hash)
             idx += 1
-            if idx % 1000 == 0: 
+            if verbose and idx % 1000 == 0: 
                 print(f"Обработано {idx} сегментов...")
                 
     db.mark_processing_done(full_hash, chunk_size, algo)
-    print(f"Готово!\nВремя обработки: {time.time() - start_time:.2f} сек.\nСегментов: {idx}")
+    if verbose:
+        print(f"Готово!\nВремя обработки: {time.time() - start_time:.2f} сек.\nСегментов: {idx}")
+    return idx
+
+
+def process_file_bulk(filepath, chunk_size, algo, db, storage, full_hash=None, verbose=True, deltas=None):
+    """
+    Обработать файл пакетно: индекс хранилища проверяется сразу для всех
+    сегментов блока FILE_READ_SIZE, рецепт и уникальные сегменты копятся
+    в памяти и сбрасываются через DBManager.bulk_load_file_chunks
+    каждые BULK_FLUSH_ROWS строк. Рецепт крупного файла в секционированной
+    схеме пишется в отдельную таблицу и присоединяется секцией в конце.
+    Параметры и результат - как у process_file.
+    """
+    file_name = os.path.basename(filepath)
+    file_size = os.path.getsize(filepath)
+    if full_hash is None:
+        full_hash = get_full_file_hash(filepath)
+
+    if db.file_has_processing(full_hash, chunk_size, algo):
+        if verbose:
+            print(f"Файл '{file_name}' с комбинацией '{chunk_size}_{algo}' уже был обработан ранее!")
+        return None
+
+    file_id = db.register_file(file_name, full_hash, file_size)
+    # Строки рецепта от прерванной обработки: иначе повторная вставка упрётся
+    # в первичный ключ, а repits их сегментов останутся завышенными
+    db.remove_file_recipe(file_id, chunk_size, algo)
+    own_partition = db.prepare_recipe_partition(chunk_size, algo, file_id, -(-file_size // chunk_size),
+                                                detached=True)
+    if deltas is None:
+        deltas = DeltaStore(db, storage)
+
+    if verbose:
+        print(f"Начинаем пакетную обработку: {file_name}")
+    start_time = time.time()
+
+    recipe = []
+    segments = {}
+    block_size = chunk_size * max(1, FILE_READ_SIZE // chunk_size)
+    with open(filepath, "rb") as f:
+        idx = 0
+        while block := f.read(block_size):
+            chunks = [block[i:i + chunk_size] for i in range(0, len(block), chunk_size)]
+            content_hashes = [hashlib.sha256(c).hexdigest() for c in chunks]
+
+            # Один запрос к storage_index на блок, новые сегменты - одной вставкой
+            stored = db.get_storage_offsets(chunk_size, set(content_hashes))
+            new_rows = []
+            for chunk_data, content_hash in zip(chunks, content_hashes):
+                if content_hash not in stored:
+                    stored[content_hash] = (deltas.write(chunk_size, chunk_data), len(chunk_data))
+                    new_rows.append((content_hash, *stored[content_hash]))
+            db.save_storage_index_many(chunk_size, new_rows)
+
+            for chunk_data, content_hash in zip(chunks, content_hashes):
+                if algo == "sha256":
+                    seg_hash = content_hash
+                else:
+                    seg_hash = hashlib.new(algo, chunk_data).hexdigest()
+                segment = segments.get(seg_hash)
+                if segment is None:
+                    offset, seg_size = stored[content_hash]
+                    segments[seg_hash] = [seg_size, offset, 1]
+                else:
+                    segment[2] += 1
+                recipe.append((idx, seg_hash))
+                idx += 1
+
+            if len(recipe) >= BULK_FLUSH_ROWS:
+                db.bulk_load_file_chunks(chunk_size, algo, file_id, recipe, segments, own_partition)
+                recipe, segments = [], {}
+                if verbose:
+                    print(f"Обработано {idx} сегментов...")
+
+    if recipe:
+        db.bulk_load_file_chunks(chunk_size, algo, file_id, recipe, segments, own_partition)
+    if own_partition:
+        db.attach_recipe_partition(chunk_size, algo, file_id)
+    db.mark_processing_done(full_hash, chunk_size, algo)
+    if verbose:
+        print(f"Готово!\nВремя обработки: {time.time() - start_time:.2f} сек.\nСегментов: {idx}")
+    return idx
 
 
 def restore_file(file_id, file_name, chunk_size, algo, db, storage):
@@ -146,9 +245,12 @@ def restore_file(file_id, file_name, chunk_size, algo, db, storage):
     out_path = f"restored_data/RESTORED_{file_name}"
     os.makedirs("restored_data", exist_ok=True)
     
+    resolver = SegmentResolver(db, storage)
+    batch = max(1, FILE_READ_SIZE // chunk_size)
     with open(out_path, "wb") as f:
-        for seg_hash, offset, size in recipe:
-            f.write(storage.read_segment(chunk_size, offset, size))
+        for i in range(0, len(recipe), batch):
+            spans = [(offset, size) for _, offset, size in recipe[i:i + batch]]
+            f.write(b"".join(resolver.read(chunk_size, spans)))
     
     print(f"Файл успешно восстановлен в: {out_path}")
 
@@ -212,7 +314,7 @@ if __name__ == "__main__":
     # 3. Выбрать размер сегмента
     # 4. Выбрать алгоритм
      
-    inp = input("Выберите действие: \n1 - Записать файл \n2 - Восстановить файл \n")
+    inp = input("Выберите действие: \n1 - Записать файл \n2 - Восстановить файл \n3 - Удалить рецепт файла \n")
 
     if inp == "1":
         selected = select_file()
@@ -231,5 +333,22 @@ if __name__ == "__main__":
                 chunk_size, algo = result
                 restore_file(file_id, file_name, chunk_size, algo, db, storage)
 
+    elif inp == "3":
+        file_info = select_file_from_db(db)
+        if file_info:
+            file_id, file_name, file_hash, processing_done = file_info
+            result = select_processing_from_done(processing_done)
+
+            if result:
+                chunk_size, algo = result
+                removed = db.remove_file_recipe(file_id, chunk_size, algo)
+                print(f"Рецепт {file_name} ({chunk_size}_{algo}) удалён: {removed} строк")
+                # Иначе app.batch_ingest по манифесту сочтёт файл обработанным
+                if os.path.exists(INGEST_MANIFEST):
+                    from app.batch_ingest import Manifest
+                    manifest = Manifest(INGEST_MANIFEST)
+                    manifest.forget(file_hash, f"{chunk_size}_{algo}")
+                    manifest.close()
+
         
     db.close()
\ No newline at end of file
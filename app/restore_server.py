@@ -0,0 +1,406 @@
+"""
+Сервер восстановления файлов (asyncio, HTTP/1.1).
+
+Файл собирается по рецепту на лету и отдаётся потоком, без копии в restored_data/.
+Сегменты фиксированного размера: сегмент i начинается с i * chunk_size, поэтому
+из БД берётся только окно рецепта под запрошенный диапазон. Окна рецептов и
+сегменты хранятся в общих LRU-кэшах с лимитом по байтам, поэтому параллельные
+клиенты популярных файлов не перечитывают БД и хранилище.
+
+Маршруты:
+    GET /files                                  - список файлов (JSON)
+    GET|HEAD /files/{file_id|file_name}?chunk_size=1024&algo=sha256
+        - содержимое файла, поддерживается Range: bytes=a-b | a- | -n
+    GET /stats                                  - состояние кэшей (JSON)
+
+Запуск:
+    python -m app.restore_server [--host 127.0.0.1] [--port 8080]
+"""
+
+import sys
+import asyncio
+import argparse
+import json
+from array import array
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+from app.cache import LRUCache, CACHE_ENTRY_OVERHEAD
+from app.db_manager import DBManager
+from app.delta import SegmentResolver
+from app.storage_manager import StorageManager
+from app.config import (
+    FILE_READ_SIZE, RESTORE_HOST, RESTORE_PORT, DELTA_CHUNK_SIZES,
+    SEGMENT_CACHE_BYTES, RECIPE_CACHE_BYTES, get_postgres_config,
+)
+
+# Сколько байт файла собирается за одно обращение к хранилищу
+STREAM_WINDOW = FILE_READ_SIZE
+# Не больше стольких сегментов в окне рецепта: Range-запрос малого диапазона
+# не тянет из БД лишнего, при малых chunk_size окно короче STREAM_WINDOW
+RECIPE_WINDOW_SEGMENTS = 2048
+
+REASONS = {
+    200: "OK", 206: "Partial Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 416: "Range Not Satisfiable", 500: "Internal Server Error",
+}
+
+
+class RecipeWindow:
+    """
+    Окно рецепта: смещения сегментов first.. в хранилище и их размеры.
+    rows - [(storage_offset, segment_size), ...], см. DBManager.get_recipe_window.
+    """
+
+    def __init__(self, first: int, rows):
+        self.first = first
+        self.offsets = array("q")
+        self.sizes = array("q")
+        for offset, size in rows:
+            self.offsets.append(offset)
+            self.sizes.append(size)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def nbytes(self) -> int:
+        return len(self.offsets) * 16 + CACHE_ENTRY_OVERHEAD
+
+
+def window_segments(chunk_size: int) -> int:
+    """Сегментов в одном окне рецепта"""
+    return max(1, min(STREAM_WINDOW // chunk_size, RECIPE_WINDOW_SEGMENTS))
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = "", headers: dict | None = None):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+        self.message = message or REASONS.get(status, "")
+        self.headers = headers or {}
+
+
+class ResponseAborted(ConnectionError):
+    """Ошибка после отправки заголовков 200/206: соединение разорвано, клиент видит неполное тело"""
+
+
+def parse_range(header: str | None, length: int) -> tuple[int, int] | None:
+    """
+    Разбор заголовка Range (один диапазон).
+    Возвращает (start, end) включительно или None, если отдаём файл целиком.
+    """
+    if not header:
+        return None
+    unsatisfiable = {"Content-Range": f"bytes */{length}"}
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Несколько диапазонов не поддерживаем - по RFC 9110 Range можно проигнорировать
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise HTTPError(416, headers=unsatisfiable)
+            start, end = max(0, length - suffix), length - 1
+        else:
+            start = int(first)
+            end = int(last) if last else length - 1
+    except ValueError:
+        return None
+    if start >= length or start > end:
+        raise HTTPError(416, headers=unsatisfiable)
+    return start, min(end, length - 1)
+
+
+class RestoreService:
+    """Поиск файлов, кэши рецептов и сегментов, сборка диапазонов"""
+
+    def __init__(self, db: DBManager, storage: StorageManager,
+                 segment_cache_bytes: int = SEGMENT_CACHE_BYTES,
+                 recipe_cache_bytes: int = RECIPE_CACHE_BYTES):
+        self.db = db
+        self.storage = storage
+        self.segments = LRUCache(segment_cache_bytes)
+        # Декодированные дельта-сегменты попадают в тот же кэш сегментов
+        self.resolver = SegmentResolver(db, storage, self.segments)
+        self.recipes = LRUCache(recipe_cache_bytes)
+        self._loading = {}
+        # psycopg2-соединение одно на сервис - запросы к БД выполняем по очереди
+        self._db_lock = asyncio.Lock()
+
+    async def _db_call(self, func, *args):
+        async with self._db_lock:
+            return await asyncio.to_thread(func, *args)
+
+    async def list_files(self) -> list[dict]:
+        rows = await self._db_call(self.db.list_files)
+        return [{"file_id": fid, "file_name": name, "file_size": size, "processing_done": done}
+                for fid, name, size, done in rows]
+
+    async def find_file(self, ref: str) -> tuple:
+        """Файл по file_id (число) или по имени"""
+        if ref.isdigit():
+            row = await self._db_call(self.db.get_file, int(ref))
+        else:
+            row = await self._db_call(self.db.get_file_by_name, ref)
+        if row is None:
+            raise HTTPError(404, f"Файл '{ref}' не найден")
+        return row
+
+    async def get_window(self, file_id: int, chunk_size: int, algo: str,
+                         length: int, window: int) -> RecipeWindow:
+        """
+        Окно рецепта из кэша; одновременные запросы одного окна ждут одну загрузку.
+        length - размер файла: по нему проверяется, что в окне все сегменты.
+        """
+        key = (file_id, chunk_size, algo, window)
+        recipe = self.recipes.get(key)
+        if recipe is not None:
+            return recipe
+        loading = self._loading.get(key)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            per_window = window_segments(chunk_size)
+            first = window * per_window
+            last = min(first + per_window, -(-length // chunk_size)) - 1
+            rows = await self._db_call(self.db.get_recipe_window, file_id, chunk_size, algo, first, last)
+            if len(rows) != last - first + 1:
+                raise HTTPError(404, "Контракт восстановления файла не найден в БД")
+            recipe = RecipeWindow(first, rows)
+            self.recipes.put(key, recipe, recipe.nbytes())
+            future.set_result(recipe)
+            return recipe
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже получено вызывающим, не оставляем его «неполученным» в future
+            future.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+    async def read_window(self, chunk_size: int, recipe: RecipeWindow, first: int, last: int) -> list[bytes]:
+        """Сегменты first..last окна: из кэша, недостающие - одним проходом по хранилищу с раскрытием дельт"""
+        segments = [None] * (last - first + 1)
+        missing = []
+        for i in range(first, last + 1):
+            data = self.segments.get((chunk_size, recipe.offsets[i]))
+            if data is None:
+                missing.append(i)
+            else:
+                segments[i - first] = data
+
+        if missing:
+            spans = [(recipe.offsets[i], recipe.sizes[i]) for i in missing]
+            # Цепочки дельт запрашиваем здесь, под общей блокировкой соединения, а не из потока resolver
+            chains = None
+            if chunk_size in DELTA_CHUNK_SIZES:
+                chains = await self._db_call(self.db.get_delta_chains, chunk_size, [offset for offset, _ in spans])
+            loaded = await asyncio.to_thread(self.resolver.read, chunk_size, spans, 0, chains)
+            for i, data in zip(missing, loaded):
+                segments[i - first] = data
+                self.segments.put((chunk_size, recipe.offsets[i]), data, len(data) + CACHE_ENTRY_OVERHEAD)
+        return segments
+
+    async def stream(self, file_id: int, chunk_size: int, algo: str, length: int, start: int, end: int):
+        """Асинхронный генератор байт файла [start, end] окнами рецепта"""
+        window_bytes = window_segments(chunk_size) * chunk_size
+        position = start
+        while position <= end:
+            window = position // window_bytes
+            recipe = await self.get_window(file_id, chunk_size, algo, length, window)
+            # Сегменты окна, покрывающие [position, end]
+            first = position // chunk_size - recipe.first
+            last = min(end // chunk_size - recipe.first, len(recipe) - 1)
+
+            segments = await self.read_window(chunk_size, recipe, first, last)
+            data = b"".join(segments)
+            skip = position - (recipe.first + first) * chunk_size
+            take = min(end + 1, (recipe.first + last + 1) * chunk_size) - position
+            yield data[skip:skip + take]
+            position += take
+            if position <= end:
+                # Окно из кэша и незаполненный буфер сокета не уступают цикл событий -
+                # без этого длинный поток задерживает запросы остальных клиентов
+                await asyncio.sleep(0)
+
+
+class RestoreServer:
+    """HTTP/1.1 поверх asyncio.start_server с keep-alive"""
+
+    def __init__(self, service: RestoreService):
+        self.service = service
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.send_error(writer, HTTPError(400), keep_alive=False)
+                    break
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                # На HEAD - только заголовки, иначе тело сбило бы разбор следующего ответа
+                with_body = method != "HEAD"
+                try:
+                    await self.dispatch(writer, method, target, headers, keep_alive)
+                except HTTPError as e:
+                    await self.send_error(writer, e, keep_alive, with_body)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    await self.send_error(writer, HTTPError(500, str(e)), False, with_body)
+                    break
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, writer, method: str, target: str, headers: dict, keep_alive: bool):
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405)
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+
+        if parts == ["files"]:
+            body = json.dumps(await self.service.list_files(), ensure_ascii=False).encode()
+            await self.send_head(writer, 200, {"Content-Type": "application/json; charset=utf-8",
+                                               "Content-Length": len(body)}, keep_alive)
+            if method == "GET":
+                writer.write(body)
+            await writer.drain()
+            return
+
+        if parts == ["stats"]:
+            body = json.dumps({"segments": self.service.segments.stats(),
+                               "recipes": self.service.recipes.stats()}).encode()
+            await self.send_head(writer, 200, {"Content-Type": "application/json",
+                                               "Content-Length": len(body)}, keep_alive)
+            if method == "GET":
+                writer.write(body)
+            await writer.drain()
+            return
+
+        if len(parts) != 2 or parts[0] != "files":
+            raise HTTPError(404)
+
+        file_id, file_name, file_size, processing_done = await self.service.find_file(parts[1])
+        chunk_size, algo = self.select_processing(parse_qs(url.query), processing_done or [])
+
+        length = file_size
+        byte_range = parse_range(headers.get("range"), length) if length else None
+        head = {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name, safe='')}",
+            "Accept-Ranges": "bytes",
+        }
+        if byte_range is None:
+            start, end, status = 0, length - 1, 200
+        else:
+            start, end = byte_range
+            status = 206
+            head["Content-Range"] = f"bytes {start}-{end}/{length}"
+        head["Content-Length"] = end - start + 1 if length else 0
+        if length:
+            # Первое окно - до заголовков: рецепт отсутствует или неполон -> 404, а не оборванный поток
+            await self.service.get_window(file_id, chunk_size, algo, length,
+                                          start // (window_segments(chunk_size) * chunk_size))
+
+        await self.send_head(writer, status, head, keep_alive)
+        if method == "GET" and length:
+            try:
+                async for data in self.service.stream(file_id, chunk_size, algo, length, start, end):
+                    writer.write(data)
+                    await writer.drain()
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                # Ответ об ошибке попал бы в тело файла - только разрыв соединения
+                writer.transport.abort()
+                print(f"Передача файла {file_id} прервана: {e!r}", file=sys.stderr)
+                raise ResponseAborted(str(e)) from e
+        await writer.drain()
+
+    @staticmethod
+    def select_processing(query: dict, processing_done: list) -> tuple[int, str]:
+        """Пара chunk_size - algo из запроса; по умолчанию - первая обработка файла"""
+        if "chunk_size" in query and "algo" in query:
+            try:
+                chunk_size = int(query["chunk_size"][0])
+            except ValueError:
+                raise HTTPError(400, "chunk_size должен быть числом")
+            key = f"{chunk_size}_{query['algo'][0]}"
+        elif processing_done:
+            key = processing_done[0]
+        else:
+            raise HTTPError(404, "Файл не был обработан")
+        if key not in processing_done:
+            raise HTTPError(404, f"Файл не обработан с комбинацией '{key}'")
+        size, algo = key.split("_", 1)
+        return int(size), algo
+
+    @staticmethod
+    async def send_head(writer, status: int, headers: dict, keep_alive: bool):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def send_error(self, writer, error: HTTPError, keep_alive: bool, with_body: bool = True):
+        body = error.message.encode()
+        await self.send_head(writer, error.status, {**error.headers,
+                                                    "Content-Type": "text/plain; charset=utf-8",
+                                                    "Content-Length": len(body)}, keep_alive)
+        if with_body:
+            writer.write(body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, service: RestoreService):
+    server = await asyncio.start_server(RestoreServer(service).handle, host, port)
+    print(f"Сервер восстановления: http://{host}:{port}/files")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер восстановления файлов")
+    parser.add_argument("--host", default=RESTORE_HOST)
+    parser.add_argument("--port", type=int, default=RESTORE_PORT)
+    parser.add_argument("--segment-cache", type=int, default=SEGMENT_CACHE_BYTES,
+                        help="лимит кэша сегментов, байт")
+    parser.add_argument("--recipe-cache", type=int, default=RECIPE_CACHE_BYTES,
+                        help="лимит кэша окон рецептов, байт")
+    args = parser.parse_args()
+
+    db = DBManager(get_postgres_config())
+    service = RestoreService(db, StorageManager(), args.segment_cache, args.recipe_cache)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
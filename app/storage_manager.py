@@ -30,7 +30,35 @@ class StorageManager:
         with open(path, "rb") as f:
             f.seek(offset)
             return f.read(length)
-        
+
+    def read_segments(self, chunk_size, spans, max_gap=0) -> list[bytes]:
+        """
+        Прочитать несколько участков [(offset, length), ...] за одно открытие файла.
+        Участки, между которыми не больше max_gap байт, читаются одним вызовом read.
+        """
+        path = self._path(chunk_size)
+        if not spans or not os.path.exists(path):
+            return [b""] * len(spans)
+        result = [b""] * len(spans)
+        order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+        with open(path, "rb") as f:
+            i = 0
+            while i < len(order):
+                # Склеиваем подряд идущие участки в один read
+                start = spans[order[i]][0]
+                end = start + spans[order[i]][1]
+                j = i + 1
+                while j < len(order) and spans[order[j]][0] <= end + max_gap:
+                    end = max(end, spans[order[j]][0] + spans[order[j]][1])
+                    j += 1
+                f.seek(start)
+                buf = f.read(end - start)
+                for k in order[i:j]:
+                    offset, length = spans[k]
+                    result[k] = buf[offset - start:offset - start + length]
+                i = j
+        return result
+
     def storage_size(self, chunk_size):
         """Размер хранилища в байтах"""
         path = self._path(chunk_size)